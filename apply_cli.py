@@ -0,0 +1,128 @@
+# --- apply_cli.py ---
+"""Headless 'Apply Canvas to Images': applies a saved layout's overlay to its tile files.
+
+Usage:
+    python apply_cli.py layout.json [--overlay edited.png] [--transparency-color #ff00ff]
+                        [--tolerance 8] [--invert] [--opacity 100] [--workers 16]
+                        [--dry-run] [--report changes.csv]
+
+Key/blend options default to the values stored in the layout (see CanvasWindow.get_layout_data).
+No display is needed, so this can run on build machines.
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from PIL import Image
+
+from canvas.apply_kernel import parse_key, to_rgba_array
+from canvas.apply_plan import build_apply_jobs
+from canvas.apply_report import summarize_reports, write_report
+from canvas.apply_runner import run_jobs
+
+def load_overlay(layout_data, overlay_path=None):
+    """Overlay from --overlay, else the base64 PNG embedded in the layout."""
+    if overlay_path:
+        return Image.open(overlay_path).convert("RGBA")
+    # Saved at the top level by get_layout_data; older files may carry it in settings
+    overlay_b64 = layout_data.get("overlay_image_data") or layout_data.get("settings", {}).get("overlay_image_data")
+    if not overlay_b64: return None
+    return Image.open(io.BytesIO(base64.b64decode(overlay_b64))).convert("RGBA")
+
+def load_tiles(layout_data, transparency_color, tolerance, invert):
+    """Builds apply tile records from the layout's canvas_items, reading each tile from disk."""
+    tiles = []; missing_files = []
+    for item in layout_data.get("canvas_items", []):
+        fp = item.get("filepath"); x = item.get("x"); y = item.get("y")
+        if not fp or not isinstance(x, (int, float)) or not isinstance(y, (int, float)):
+            logging.warning(f"Skipping invalid item data: {item}"); continue
+        try:
+            image = Image.open(fp); image.load()
+        except (FileNotFoundError, OSError) as e:
+            logging.warning(f"Skip '{fp}': {e}"); missing_files.append(fp); continue
+        tile_color, tile_tolerance = parse_key(item["transparency_color"], tolerance) if item.get("transparency_color") else (transparency_color, tolerance)
+        tiles.append({
+            'filename': fp, 'x': x, 'y': y, 'current_image': image, 'original_image': image,
+            'transparency_color': tile_color, 'tolerance': tile_tolerance, 'invert': invert
+        })
+    return tiles, missing_files
+
+def apply_layout_file(layout_path, args):
+    """Applies one layout. Returns (updated, unchanged, errors, reports)."""
+    with open(layout_path, 'r') as f: layout_data = json.load(f)
+    if not isinstance(layout_data, dict) or "canvas_items" not in layout_data: raise ValueError("Invalid format.")
+    settings = layout_data.get("settings", {})
+
+    tolerance = args.tolerance if args.tolerance is not None else int(settings.get("tolerance", 0))
+    transparency_color, tolerance = parse_key(args.transparency_color if args.transparency_color is not None else settings.get("transparency_color"), tolerance)
+    invert = args.invert if args.invert is not None else bool(settings.get("invert_transparency", False))
+    opacity = (args.opacity if args.opacity is not None else settings.get("overlay_opacity", 100)) / 100.0
+
+    overlay_image = load_overlay(layout_data, args.overlay)
+    if overlay_image is None: raise ValueError("No overlay: layout has no overlay_image_data and --overlay not given.")
+    overlay_data = layout_data.get("overlay") or {}
+    origin = (int(round(overlay_data.get("x", 0))), int(round(overlay_data.get("y", 0))))
+    if args.offset: origin = tuple(args.offset)
+    logging.info(f"Apply '{layout_path}': Overlay size: {overlay_image.width}x{overlay_image.height}, Origin: {origin}")
+
+    tiles, missing_files = load_tiles(layout_data, transparency_color, tolerance, invert)
+    overlay = {'size': overlay_image.size, 'origin': origin, 'opacity': opacity}
+    jobs, _, unplanned_missing = build_apply_jobs(tiles, overlay)
+    results = run_jobs(jobs, to_rgba_array(overlay_image), parallel=args.workers != 1, max_workers=args.workers, dry_run=args.dry_run)
+
+    errors = len(missing_files) + len(unplanned_missing) + sum(1 for _, err, _, _ in results if err)
+    updated = sum(1 for _, err, written, _ in results if not err and written)
+    unchanged = sum(1 for _, err, written, _ in results if not err and not written)
+    return updated, unchanged, errors, [report for _, _, _, report in results if report]
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Apply a saved canvas layout's overlay to its tile images (no GUI).")
+    parser.add_argument("layouts", nargs="+", help="Layout JSON file(s) saved with Layout > Save")
+    parser.add_argument("--overlay", help="Overlay PNG to use instead of the one embedded in the layout (single layout only)")
+    parser.add_argument("--offset", nargs=2, type=int, metavar=("X", "Y"), help="Overlay origin, overrides the layout's overlay x/y")
+    parser.add_argument("--transparency-color", help="Key color as #rrggbb, or several as '#ff00ff,#00ff00:8,#000000' (optional per-color tolerance; default: layout setting)")
+    parser.add_argument("--tolerance", type=int, help="Per-channel key tolerance 0-255 (default: layout setting)")
+    parser.add_argument("--invert", dest="invert", action="store_true", default=None, help="Invert transparency keying")
+    parser.add_argument("--no-invert", dest="invert", action="store_false", help="Don't invert transparency keying")
+    parser.add_argument("--opacity", type=int, help="Overlay opacity 0-100 (default: layout setting)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores, 1 = serial)")
+    parser.add_argument("--dry-run", action="store_true", help="Compute every tile but write nothing")
+    parser.add_argument("--report", help="Save the per-tile change report (.csv, otherwise JSON)")
+    parser.add_argument("--verbose", action="store_true", help="Debug logging")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, level=logging.DEBUG if args.verbose else logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s')
+    if args.overlay and len(args.layouts) > 1:
+        logging.error("--overlay can only be used with a single layout."); return 2
+    if args.opacity is not None and not 0 <= args.opacity <= 100:
+        logging.error("--opacity must be between 0 and 100."); return 2
+
+    failed = False; all_reports = []
+    for layout_path in args.layouts:
+        try:
+            updated, unchanged, errors, reports = apply_layout_file(layout_path, args)
+            changed_tiles, changed_pixels, key_lost = summarize_reports(reports)
+            if args.dry_run:
+                print(f"{os.path.basename(layout_path)}: Dry run: {changed_tiles} of {len(reports)} tile(s) would change ({changed_pixels} pixels), Errors: {errors}.")
+            else:
+                print(f"{os.path.basename(layout_path)}: Updated: {updated}, Unchanged: {unchanged}, Errors: {errors}.")
+            for filename in key_lost: logging.warning(f"Transparency key not preserved in '{filename}'.")
+            all_reports.extend(reports)
+            failed = failed or errors > 0
+        except (OSError, ValueError, json.JSONDecodeError) as e:
+            logging.error(f"Apply failed for '{layout_path}': {e}")
+            failed = True
+    if args.report:
+        try: write_report(all_reports, args.report)
+        except OSError as e: logging.error(f"Could not save report '{args.report}': {e}"); failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# --- bench_tkimage.py ---
+"""Micro-benchmark: ImageTk.PhotoImage vs canvas.tkimage (new photos and in-place updates), RGB and RGBA tiles.
+Usage: python bench_tkimage.py [--sizes 64 256 1024] [--repeat 50] [--payload-only]
+--payload-only (or no display) times just the Python-side payload build of each path."""
+import argparse
+import time
+import tkinter as tk
+import numpy as np
+from PIL import Image, ImageTk
+
+from canvas.tkimage import ppm_payload, to_photo, update_photo
+
+SAMPLES = ["RGB", "RGBA", "RGBA key"] # Opaque RGB, opaque RGBA and a keyed sprite (RGBA with transparent pixels)
+
+def sample(size, kind):
+    """Random tile of the given SAMPLES kind; keyed tiles get a transparent border like a keyed sprite."""
+    rgba = np.random.default_rng(size).integers(0, 256, (size, size, 4), dtype=np.uint8); rgba[..., 3] = 255
+    if kind == "RGB": return Image.fromarray(rgba[..., :3], 'RGB')
+    if kind == "RGBA key": rgba[:size // 4, :, 3] = 0; rgba[:, :size // 4, 3] = 0
+    return Image.fromarray(rgba, 'RGBA')
+
+def timed(fn, repeat):
+    fn() # Warm up
+    start = time.perf_counter()
+    for _ in range(repeat): fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def bench_payloads(sizes, repeat):
+    """Payload build only, no Tk: what to_photo does before Tk decodes it, and what an RGBA tile
+    would cost to send as PPM (alpha stripped) if Tk could take it."""
+    print(f"{'tile':>18} {'ppm_payload':>12} {'strip alpha + PPM':>18}  (ms per image, no Tk decode)")
+    for size in sizes:
+        for kind in SAMPLES:
+            image = sample(size, kind)
+            payload = f"{timed(lambda: ppm_payload(image), repeat):12.3f}" if image.mode == 'RGB' else f"{'-':>12}"
+            stripped = timed(lambda: ppm_payload(image.convert('RGB')), repeat)
+            print(f"{f'{size}x{size} {kind}':>18} {payload} {stripped:18.3f}")
+
+def bench_photos(root, sizes, repeat):
+    keep = []
+    print(f"{'tile':>18} {'ImageTk new':>12} {'to_photo':>10} {'ImageTk paste':>14} {'update_photo':>13}  (ms per image)")
+    for size in sizes:
+        for kind in SAMPLES:
+            image = sample(size, kind); pil_photo = ImageTk.PhotoImage(image); photo = to_photo(image, root)
+            results = [timed(lambda: keep.append(ImageTk.PhotoImage(image)), repeat),
+                       timed(lambda: keep.append(to_photo(image, root)), repeat),
+                       timed(lambda: pil_photo.paste(image), repeat),
+                       timed(lambda: update_photo(photo, image), repeat)]
+            keep.clear()
+            print(f"{f'{size}x{size} {kind}':>18} {results[0]:12.3f} {results[1]:10.3f} {results[2]:14.3f} {results[3]:13.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--payload-only", action="store_true")
+    args = parser.parse_args()
+    bench_payloads(args.sizes, args.repeat)
+    if args.payload_only: return
+    try: root = tk.Tk()
+    except tk.TclError as e: print(f"No display ({e}), skipping the Tk photo timings."); return
+    root.withdraw(); print()
+    bench_photos(root, args.sizes, args.repeat)
+    root.destroy()
+
+if __name__ == "__main__":
+    main()
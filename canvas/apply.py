@@ -1,25 +1,195 @@
 # --- canvas/apply.py ---
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageDraw
 import logging
 import os
+import queue
+import threading
+import time
+
+from .apply_kernel import parse_key, to_rgba_array
+from .apply_runner import run_jobs
+from .apply_plan import build_apply_jobs
+from .apply_report import summarize_reports, write_report
+
+PROGRESS_POLL_MS = 100
+
+def _format_bytes(count):
+    for unit in ("B", "KB", "MB"):
+        if count < 1024: return f"{count:.0f} {unit}"
+        count /= 1024.0
+    return f"{count:.1f} GB"
+
+class ApplyTask:
+    """One apply run on a worker thread. The thread only touches the snapshot it was
+    given and reports through a queue; the Tk side polls that queue with after()."""
+    def __init__(self, view, tiles, overlay=None, overlay_rgba=None, parallel=False, error_count=0, dry_run=False):
+        self.view = view; self.tiles = tiles; self.overlay = overlay; self.overlay_rgba = overlay_rgba
+        self.parallel = parallel; self.error_count = error_count; self.dry_run = dry_run
+        self.queue = queue.Queue(); self.cancel_event = threading.Event()
+        self.thread = None; self.dialog = None; self.started_at = None; self.total = 0; self.finished = False
+
+    def is_running(self): return self.thread is not None and not self.finished
+
+    def start(self):
+        self._build_dialog()
+        if hasattr(self.view.app, 'apply_button'): self.view.app.apply_button.config(state=tk.DISABLED)
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name="canvas-apply", daemon=True)
+        self.thread.start()
+        self.view.after(PROGRESS_POLL_MS, self._poll)
+
+    def cancel(self):
+        """Stops the run after the tiles currently being processed."""
+        if self.cancel_event.is_set(): return
+        self.cancel_event.set()
+        logging.info("Apply: Cancel requested.")
+        if self.dialog:
+            self.status_label.config(text="Cancelling...")
+            self.cancel_button.config(state=tk.DISABLED)
+
+    def _build_dialog(self):
+        self.dialog = tk.Toplevel(self.view)
+        self.dialog.title("Dry Run: Canvas to Images" if self.dry_run else "Applying Canvas to Images")
+        self.dialog.transient(self.view.winfo_toplevel())
+        self.dialog.resizable(False, False)
+        self.dialog.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.progress_bar = ttk.Progressbar(self.dialog, length=320, mode='determinate')
+        self.progress_bar.pack(padx=10, pady=(10, 5))
+        self.status_label = tk.Label(self.dialog, text="Planning...", anchor="w", width=48)
+        self.status_label.pack(padx=10, pady=2)
+        self.cancel_button = tk.Button(self.dialog, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(pady=(2, 10))
+
+    # --- Worker thread (no Tk calls) ---
+    def _run(self):
+        try:
+            jobs, unchanged_count, missing_files = build_apply_jobs(self.tiles, self.overlay)
+            self.queue.put(('planned', len(jobs)))
+            results = run_jobs(jobs, self.overlay_rgba, parallel=self.parallel,
+                               progress=self._report_progress, cancel_event=self.cancel_event, dry_run=self.dry_run)
+            self.queue.put(('done', len(jobs), results, unchanged_count, missing_files))
+        except Exception as e:
+            logging.error(f"Critical apply error: {e}", exc_info=True)
+            self.queue.put(('error', str(e)))
+
+    def _report_progress(self, done, total, bytes_written):
+        self.queue.put(('progress', done, total, bytes_written))
+
+    # --- Tk thread ---
+    def _poll(self):
+        finished = None; progress = None
+        try:
+            while True:
+                message = self.queue.get_nowait()
+                if message[0] == 'planned':
+                    self.total = message[1]; self.progress_bar.config(maximum=max(1, self.total))
+                elif message[0] == 'progress':
+                    progress = message[1:]
+                else:
+                    finished = message
+        except queue.Empty:
+            pass
+        if progress and not self.cancel_event.is_set(): self._show_progress(*progress)
+        if finished: self._finish(finished)
+        else: self.view.after(PROGRESS_POLL_MS, self._poll)
+
+    def _show_progress(self, done, total, bytes_written):
+        self.progress_bar.config(value=done)
+        elapsed = time.monotonic() - self.started_at
+        eta = elapsed / done * (total - done) if done else 0
+        self.status_label.config(text=f"Tiles: {done}/{total}   Written: {_format_bytes(bytes_written)}   ETA: {eta:.0f}s")
+
+    def _finish(self, message):
+        self.finished = True
+        if self.dialog: self.dialog.destroy(); self.dialog = None
+        if hasattr(self.view.app, 'apply_button'): self.view.app.apply_button.config(state=tk.NORMAL)
+        if message[0] == 'error':
+            messagebox.showerror("Error", f"Apply failed.\n{message[1]}")
+            return
+        _, job_count, results, unchanged_count, missing_files = message
+        error_count = self.error_count + len(missing_files); processed_count = unchanged_count
+        unchanged_on_disk = 0
+        reports = [report for _, _, _, report in results if report]
+        self.view.last_apply_report = reports # Kept for inspection after the run
+        if self.dry_run:
+            self._finish_dry_run(job_count, results, reports, error_count)
+            return
+        grid_updates = []
+        for filename, tile_error, written, _ in results:
+            if tile_error:
+                error_count += 1
+                continue
+            if not written:
+                # Pixels already on disk, nothing to reload
+                unchanged_on_disk += 1; processed_count += 1
+                continue
+            try:
+                grid_updates.append((filename, Image.open(filename)))
+            except Exception as reload_err:
+                logging.error(f"Grid update failed '{filename}': {reload_err}")
+            processed_count += 1
+        # Update grid window: only the written tiles' thumbnails, one panel refresh
+        if grid_updates:
+            try: self.view.grid_window.update_images_in_grid(grid_updates)
+            except Exception as grid_err: logging.error(f"Grid update failed: {grid_err}", exc_info=True)
+
+        # Finish
+        if self.overlay is None and not job_count:
+            messagebox.showinfo("Apply", "No changes to apply.")
+            return
+        cancelled_count = job_count - len(results)
+        log_msg = f"Apply {'cancelled' if cancelled_count else 'complete'}. Updated: {processed_count}, Errors: {error_count}."
+        if unchanged_on_disk: log_msg += f" (Unchanged on disk: {unchanged_on_disk})"
+        if cancelled_count: log_msg += f" Not applied: {cancelled_count}."
+        _, _, key_lost = summarize_reports(reports)
+        if key_lost:
+            # Safety check: the key color should survive every apply
+            log_msg += f"\nWarning: Transparency key not preserved in {len(key_lost)} tile(s): " + ", ".join(os.path.basename(f) for f in key_lost[:5])
+        logging.info(log_msg)
+        if error_count > 0:
+            messagebox.showerror("Apply Errors", f"{log_msg}\nCheck log.")
+        elif cancelled_count:
+            messagebox.showwarning("Apply Cancelled", log_msg)
+        elif key_lost:
+            messagebox.showwarning("Apply Warning", log_msg)
+        else:
+            messagebox.showinfo("Success", log_msg)
+
+    def _finish_dry_run(self, job_count, results, reports, error_count):
+        """Summarizes what an apply would change and offers to save the per-tile report."""
+        error_count += sum(1 for _, tile_error, _, _ in results if tile_error)
+        changed_tiles, changed_pixels, key_lost = summarize_reports(reports)
+        log_msg = f"Dry run: {changed_tiles} of {len(reports)} tile(s) would change ({changed_pixels} pixels). Errors: {error_count}."
+        if job_count - len(results): log_msg += f" Not checked (cancelled): {job_count - len(results)}."
+        if key_lost: log_msg += f"\nTransparency key not preserved in {len(key_lost)} tile(s)."
+        logging.info(log_msg)
+        if not reports:
+            messagebox.showinfo("Dry Run", log_msg)
+            return
+        if messagebox.askyesno("Dry Run", f"{log_msg}\n\nSave per-tile report?"):
+            path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json"), ("CSV files", "*.csv")])
+            if path:
+                try: write_report(reports, path)
+                except Exception as e:
+                    logging.error(f"Error saving apply report: {e}", exc_info=True)
+                    messagebox.showerror("Error", f"Could not save report.\n{e}")
 
 def run_apply_canvas_to_images(canvas_window):
-    """Applies changes from overlay to tiles and handles palette changes."""
+    """Snapshots overlay and tiles, then applies them in the background (see ApplyTask)."""
     try:
         view = canvas_window
-        if not (hasattr(view, 'current_scale_factor') and abs(view.current_scale_factor - 1.0) < 0.001):
-            messagebox.showwarning("Zoom Error", "Please reset zoom to 100% before applying (hotkey Z)")
-            logging.warning("Apply cancelled: Zoom not 100%.")
+        if getattr(view, 'apply_task', None) and view.apply_task.is_running():
+            messagebox.showinfo("Apply", "Apply is already running.")
             return
+        # Tiles and overlay are read from stored world coords, so the view zoom doesn't matter
 
         # Set applying_canvas flag for palette handling
         if hasattr(view, 'app'):
             view.app.applying_canvas = True
 
         has_overlay = view.pasted_overlay_pil_image is not None
-        has_palette_changes = False
 
         if not has_overlay and not view.images:
             messagebox.showinfo("Apply", "No changes to apply.")
@@ -29,7 +199,7 @@ def run_apply_canvas_to_images(canvas_window):
             # Get overlay info
             overlay_width = view.pasted_overlay_pil_image.width
             overlay_height = view.pasted_overlay_pil_image.height
-            overlay_pixels = view.pasted_overlay_pil_image.load()
+            overlay_rgba = to_rgba_array(view.pasted_overlay_pil_image) # Own copy, later overlay edits don't reach the run
             apply_origin_x = view.pasted_overlay_offset[0]
             apply_origin_y = view.pasted_overlay_offset[1]
 
@@ -38,16 +208,12 @@ def run_apply_canvas_to_images(canvas_window):
 
             logging.info(f"Apply: Overlay size: {overlay_width}x{overlay_height}, Origin: ({apply_origin_x},{apply_origin_y})")
 
-        processed_count = 0
         error_count = 0
+        tiles = []
 
-        # Iterate Tiles
+        # Gather tile records (reads Tk state, so stays on this thread). Canvas code replaces
+        # tile images instead of drawing into them, so these references form a stable snapshot.
         for filename, image_info in sorted(view.images.items(), key=lambda x: x[1].get('z_index', 0)):
-            if not os.path.exists(filename):
-                logging.warning(f"Skip '{filename}': Not found.")
-                error_count += 1
-                continue
-
             try:
                 tile_item_id = image_info['id']
                 if not view.canvas.find_withtag(tile_item_id):
@@ -56,18 +222,10 @@ def run_apply_canvas_to_images(canvas_window):
                     continue
 
                 # Get the initial transparency color for this image
-                transparency_color = None
-                if 'initial_transparency_color' in image_info:
-                    color_hex = image_info['initial_transparency_color'].lstrip('#')
-                    transparency_color = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
-                elif hasattr(view, 'transparency_color') and view.transparency_color:
-                    color_hex = view.transparency_color.lstrip('#')
-                    transparency_color = tuple(int(color_hex[i:i+2], 16) for i in (0, 2, 4))
+                key_spec = image_info.get('initial_transparency_color') or getattr(view, 'transparency_color', None)
                 invert_transparency = view.app.invert_transparency.get() if hasattr(view.app, 'invert_transparency') else False
                 tolerance = view.app.tolerance_value.get() if hasattr(view.app, 'tolerance_value') else 0
-
-                tile_x = image_info.get('x', 0)
-                tile_y = image_info.get('y', 0)
+                transparency_color, tolerance = parse_key(key_spec, tolerance) # Color tuple or KeySet
 
                 # Get current image state and original image
                 current_image = image_info['image']
@@ -75,113 +233,29 @@ def run_apply_canvas_to_images(canvas_window):
                 if not current_image or not original_image:
                     continue
 
-                if has_overlay:
-                    # Process overlay changes
-                    w, h = current_image.size
-                    output_tile = Image.new('RGBA', (w, h))
-                    output_pixels = output_tile.load()
-                    current_pixels = current_image.load()
-                    original_pixels = original_image.load()
-
-                    # Pixel processing
-                    for px in range(w):
-                        for py in range(h):
-                            current_rgba = current_pixels[px, py]
-                            original_rgb = original_pixels[px, py][:3]
-
-                            # Check if pixel was originally transparent
-                            is_transparent = False
-                            if transparency_color:
-                                matches = all(abs(original_rgb[i] - transparency_color[i]) <= tolerance for i in range(3))
-                                is_transparent = matches if not invert_transparency else not matches
-
-                            if is_transparent:
-                                # Use the original transparency color
-                                output_pixels[px, py] = (transparency_color[0], transparency_color[1], transparency_color[2], 255)
-                            else:
-                                overlay_read_x = tile_x + px - apply_origin_x
-                                overlay_read_y = tile_y + py - apply_origin_y
-                                if 0 <= overlay_read_x < overlay_width and 0 <= overlay_read_y < overlay_height:
-                                    overlay_rgba = overlay_pixels[overlay_read_x, overlay_read_y]
-                                    if overlay_rgba[3] > 0:
-                                        final_alpha = int(overlay_rgba[3] * overlay_opacity)
-                                        if final_alpha > 0:
-                                            alpha_factor = final_alpha / 255.0
-                                            output_pixels[px, py] = (
-                                                int(overlay_rgba[0] * alpha_factor + current_rgba[0] * (1 - alpha_factor)),
-                                                int(overlay_rgba[1] * alpha_factor + current_rgba[1] * (1 - alpha_factor)),
-                                                int(overlay_rgba[2] * alpha_factor + current_rgba[2] * (1 - alpha_factor)),
-                                                255
-                                            )
-                                        else:
-                                            output_pixels[px, py] = current_rgba
-                                    else:
-                                        output_pixels[px, py] = current_rgba
-                                else:
-                                    output_pixels[px, py] = current_rgba
-                    
-                    # Save the processed image
-                    output_tile.save(filename)
-                else:
-                    # Handle palette changes while preserving original transparency
-                    if current_image != original_image:
-                        w, h = current_image.size
-                        output_tile = Image.new('RGBA', (w, h))
-                        output_pixels = output_tile.load()
-                        current_pixels = current_image.load()
-                        original_pixels = original_image.load()
-
-                        # Process each pixel
-                        for px in range(w):
-                            for py in range(h):
-                                original_rgba = original_pixels[px, py]
-                                current_rgba = current_pixels[px, py]
-                                original_rgb = original_rgba[:3]
-
-                                # Check if this was originally a transparent pixel
-                                is_transparent = False
-                                if transparency_color:
-                                    matches = all(abs(original_rgb[i] - transparency_color[i]) <= tolerance for i in range(3))
-                                    is_transparent = matches if not invert_transparency else not matches
-
-                                if is_transparent:
-                                    # Use the original transparency color
-                                    output_pixels[px, py] = (transparency_color[0], transparency_color[1], transparency_color[2], 255)
-                                else:
-                                    # Keep palette-mapped color for non-transparent pixels
-                                    output_pixels[px, py] = current_rgba
-
-                        # Save with preserved transparency color
-                        output_tile.save(filename)
-                        has_palette_changes = True
-
-                # Update grid window
-                try:
-                    view.grid_window.update_image_in_grid(filename, Image.open(filename))
-                except Exception as reload_err:
-                    logging.error(f"Grid update failed '{filename}': {reload_err}")
-                
-                processed_count += 1
+                tiles.append({
+                    'filename': filename, 'x': image_info.get('x', 0), 'y': image_info.get('y', 0),
+                    'current_image': current_image, 'original_image': original_image,
+                    'transparency_color': transparency_color, 'tolerance': tolerance, 'invert': invert_transparency
+                })
 
             except Exception as tile_error:
                 logging.error(f"Tile proc error '{filename}': {tile_error}", exc_info=True)
                 error_count += 1
 
-        # Finish
-        if has_overlay or has_palette_changes:
-            log_msg = f"Apply complete. Updated: {processed_count}, Errors: {error_count}."
-            logging.info(log_msg)
-            if error_count > 0:
-                messagebox.showerror("Apply Errors", f"{log_msg}\nCheck log.")
-            else:
-                messagebox.showinfo("Success", log_msg)
-        else:
-            messagebox.showinfo("Apply", "No changes to apply.")
-        
+        overlay = None
+        if has_overlay:
+            overlay = {'size': (overlay_width, overlay_height), 'origin': (apply_origin_x, apply_origin_y), 'opacity': overlay_opacity}
+        parallel = view.app.parallel_apply.get() if hasattr(view.app, 'parallel_apply') else False
+        dry_run = view.app.dry_run_apply.get() if hasattr(view.app, 'dry_run_apply') else False
+        # Planning, tile computation and write-back run off the Tk thread
+        view.apply_task = ApplyTask(view, tiles, overlay, overlay_rgba if has_overlay else None, parallel, error_count, dry_run)
+        view.apply_task.start()
+
     except Exception as e:
         logging.error(f"Critical apply error: {e}", exc_info=True)
         messagebox.showerror("Error", f"Apply failed.\n{e}")
     finally:
         # Reset applying_canvas flag
         if hasattr(view, 'app'):
-            view.app.applying_canvas = False
\ No newline at end of file
+            view.app.applying_canvas = False
@@ -0,0 +1,57 @@
+# --- canvas/apply_kernel.py ---
+import numpy as np
+from PIL import Image
+
+from .keying import key_fill_colors, parse_hex_color, parse_key, transparency_key_mask
+
+def to_rgba_array(image):
+    """Returns the pixels of a PIL image as an (h, w, 4) uint8 array."""
+    if image.mode != 'RGBA': image = image.convert('RGBA')
+    return np.asarray(image, dtype=np.uint8)
+
+def apply_overlay_to_tile(current_image, original_image, overlay_rgba, tile_pos, overlay_origin,
+                          transparency_color=None, tolerance=0, invert=False, opacity=1.0, region=None):
+    """Blends the overlay window covering this tile into the current tile pixels.
+    Keyed pixels of the original are written back as the opaque key color (transparency_color
+    is an (r, g, b) tuple or a KeySet, whose pixels get the color of the key they matched).
+    With region=None this is bit-identical to the former per-pixel loop; a tile-local
+    (x0, y0, x1, y1) region limits all work to that sub-rectangle, leaving the rest as is."""
+    current = to_rgba_array(current_image)
+    output = current.copy()
+    h, w = current.shape[:2]
+    overlay_h, overlay_w = overlay_rgba.shape[:2]
+    rx0, ry0, rx1, ry1 = region if region else (0, 0, w, h)
+
+    # Overlay read position = tile position + pixel - overlay origin
+    shift_x = tile_pos[0] - overlay_origin[0]; shift_y = tile_pos[1] - overlay_origin[1]
+    x0 = max(0, rx0, -shift_x); x1 = min(w, rx1, overlay_w - shift_x)
+    y0 = max(0, ry0, -shift_y); y1 = min(h, ry1, overlay_h - shift_y)
+    if x0 < x1 and y0 < y1:
+        window = output[y0:y1, x0:x1]
+        overlay_window = overlay_rgba[y0+shift_y:y1+shift_y, x0+shift_x:x1+shift_x]
+        overlay_alpha = overlay_window[..., 3]
+        # Same float64 arithmetic and truncation as int(a * opacity) / int(ov*f + cur*(1-f))
+        final_alpha = (overlay_alpha.astype(np.float64) * opacity).astype(np.int64)
+        blend = (overlay_alpha > 0) & (final_alpha > 0)
+        if blend.any():
+            alpha_factor = (final_alpha[blend] / 255.0)[:, None]
+            overlay_rgb = overlay_window[..., :3][blend].astype(np.float64)
+            current_rgb = window[..., :3][blend].astype(np.float64)
+            blended = (overlay_rgb * alpha_factor + current_rgb * (1 - alpha_factor)).astype(np.uint8)
+            window[blend] = np.concatenate([blended, np.full((blended.shape[0], 1), 255, np.uint8)], axis=1)
+
+    if transparency_color is not None:
+        original_window = to_rgba_array(original_image)[ry0:ry1, rx0:rx1]
+        keyed = transparency_key_mask(original_window, transparency_color, tolerance, invert)
+        output_window = output[ry0:ry1, rx0:rx1]
+        output_window[keyed, :3] = key_fill_colors(transparency_color, original_window[keyed]); output_window[keyed, 3] = 255
+    return Image.fromarray(output)
+
+def apply_palette_to_tile(current_image, original_image, transparency_color=None, tolerance=0, invert=False):
+    """Keeps the palette-mapped pixels, restoring the opaque key color where the original was keyed."""
+    output = to_rgba_array(current_image).copy()
+    if transparency_color is not None:
+        original = to_rgba_array(original_image)
+        keyed = transparency_key_mask(original, transparency_color, tolerance, invert)
+        output[keyed, :3] = key_fill_colors(transparency_color, original[keyed]); output[keyed, 3] = 255
+    return Image.fromarray(output)
@@ -0,0 +1,64 @@
+# --- canvas/apply_plan.py ---
+import logging
+import os
+
+def intersect_rects(a, b):
+    """Intersection of two (x0, y0, x1, y1) rects, or None if they don't overlap."""
+    x0 = max(a[0], b[0]); y0 = max(a[1], b[1]); x1 = min(a[2], b[2]); y1 = min(a[3], b[3])
+    if x0 >= x1 or y0 >= y1: return None
+    return (x0, y0, x1, y1)
+
+def plan_overlay_apply(tiles, overlay_offset, overlay_size):
+    """Picks the tiles the overlay actually covers.
+    tiles: iterable of (filename, x, y, w, h) in world coords.
+    Returns [(filename, region)] in input order, where region is the tile-local
+    (x0, y0, x1, y1) sub-rectangle under the overlay."""
+    ox, oy = int(round(overlay_offset[0])), int(round(overlay_offset[1]))
+    overlay_rect = (ox, oy, ox + overlay_size[0], oy + overlay_size[1])
+    plan = []; skipped = 0
+    for filename, x, y, w, h in tiles:
+        x, y = int(round(x)), int(round(y))
+        hit = intersect_rects((x, y, x + w, y + h), overlay_rect)
+        if hit is None:
+            skipped += 1
+            continue
+        plan.append((filename, (hit[0] - x, hit[1] - y, hit[2] - x, hit[3] - y)))
+    logging.info(f"Apply plan: {len(plan)} tile(s) under overlay, {skipped} untouched.")
+    return plan
+
+def has_pending_edits(tile):
+    """True when the tile's current image differs from its original (e.g. a palette remap not saved yet)."""
+    return tile['current_image'] is not tile['original_image'] and tile['current_image'] != tile['original_image']
+
+def build_apply_jobs(tiles, overlay=None):
+    """Turns tile records into runner jobs. Headless, shared by the GUI and apply_cli.
+    tiles: dicts with filename, x, y, current_image, original_image, transparency_color, tolerance, invert.
+    overlay: None for a palette-only apply, else a dict with size, origin and opacity.
+    Only tiles without pending edits are limited to the overlay's sub-rectangle (or skipped when it
+    misses them); edited tiles are processed whole so their edits and key colors are written back.
+    Returns (jobs, unchanged_count, missing_files)."""
+    regions = {}
+    if overlay:
+        plan = plan_overlay_apply([(t['filename'], t['x'], t['y'], *t['current_image'].size) for t in tiles], overlay['origin'], overlay['size'])
+        regions = dict(plan)
+    jobs = []; unchanged_count = 0; missing_files = []
+    for tile in tiles:
+        filename = tile['filename']; edited = has_pending_edits(tile)
+        if overlay and filename not in regions and not edited: continue # Overlay misses it, nothing else to save
+        if not os.path.exists(filename):
+            logging.warning(f"Skip '{filename}': Not found.")
+            missing_files.append(filename)
+            continue
+        job = {key: tile[key] for key in ('filename', 'current_image', 'original_image', 'transparency_color', 'tolerance', 'invert')}
+        if overlay and filename in regions:
+            # Process overlay changes (the whole tile when it has edits of its own)
+            job.update(kind='overlay', tile_pos=(int(round(tile['x'])), int(round(tile['y']))), overlay_origin=overlay['origin'],
+                       opacity=overlay['opacity'], region=None if edited else regions[filename])
+        elif edited:
+            # Handle palette changes while preserving original transparency
+            job['kind'] = 'palette'
+        else:
+            unchanged_count += 1
+            continue
+        jobs.append(job)
+    return jobs, unchanged_count, missing_files
@@ -0,0 +1,54 @@
+# --- canvas/apply_report.py ---
+import csv
+import json
+import logging
+import os
+import numpy as np
+
+from .apply_kernel import to_rgba_array
+from .keying import key_fill_colors, transparency_key_mask
+
+REPORT_FIELDS = ["filename", "changed_pixels", "bbox_x0", "bbox_y0", "bbox_x1", "bbox_y1",
+                 "max_delta_r", "max_delta_g", "max_delta_b", "max_delta_a", "key_pixels", "key_preserved"]
+
+def tile_change_report(filename, output_image, original_image, transparency_color=None, tolerance=0, invert=False):
+    """Vectorized diff of an output tile against its original.
+    Returns a dict with the changed pixel count, bbox (x0, y0, x1, y1) of the changes or None,
+    max per-channel delta (r, g, b, a) and whether every keyed pixel still holds the opaque key color
+    the apply kernel writes back (so it is checked against the fill, not the mask, with invert)."""
+    output = to_rgba_array(output_image); original = to_rgba_array(original_image)
+    delta = np.abs(output.astype(np.int16) - original.astype(np.int16))
+    changed = delta.any(axis=-1)
+    report = {"filename": filename, "changed_pixels": int(changed.sum()), "bbox": None,
+              "max_delta": [int(v) for v in delta.reshape(-1, 4).max(axis=0)] if delta.size else [0, 0, 0, 0],
+              "key_pixels": 0, "key_preserved": True}
+    if report["changed_pixels"]:
+        rows = np.flatnonzero(changed.any(axis=1)); cols = np.flatnonzero(changed.any(axis=0))
+        report["bbox"] = [int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1]
+    if transparency_color is not None:
+        keyed = transparency_key_mask(original, transparency_color, tolerance, invert)
+        report["key_pixels"] = int(keyed.sum())
+        fill = key_fill_colors(transparency_color, original[keyed])
+        report["key_preserved"] = bool((output[keyed, :3] == fill).all() and (output[keyed, 3] == 255).all())
+    return report
+
+def summarize_reports(reports):
+    """(changed tile count, changed pixel total, filenames whose key pixels were not preserved)"""
+    changed_tiles = sum(1 for r in reports if r["changed_pixels"])
+    changed_pixels = sum(r["changed_pixels"] for r in reports)
+    key_lost = [r["filename"] for r in reports if not r["key_preserved"]]
+    return changed_tiles, changed_pixels, key_lost
+
+def _csv_row(report):
+    bbox = report["bbox"] or [""] * 4
+    return [report["filename"], report["changed_pixels"], *bbox, *report["max_delta"], report["key_pixels"], report["key_preserved"]]
+
+def write_report(reports, path):
+    """Writes reports as CSV if path ends with .csv, otherwise as JSON."""
+    if os.path.splitext(path)[1].lower() == ".csv":
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f); writer.writerow(REPORT_FIELDS)
+            for report in reports: writer.writerow(_csv_row(report))
+    else:
+        with open(path, "w") as f: json.dump({"tiles": reports}, f, indent=4)
+    logging.info(f"Apply report with {len(reports)} tile(s) saved to {path}")
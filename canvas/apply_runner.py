@@ -0,0 +1,142 @@
+# --- canvas/apply_runner.py ---
+import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+import numpy as np
+
+from .apply_kernel import apply_overlay_to_tile, apply_palette_to_tile
+from .apply_report import tile_change_report
+from .writeback import TileWriter
+
+PARALLEL_MIN_TILES = 8   # Below this, process start-up costs more than it saves
+JOBS_PER_WORKER = 4      # Chunks per worker, keeps the pool busy while bounding pickling
+CANCEL_POLL_SECONDS = 0.1
+
+# Worker-side view of the overlay published by the parent (set by _init_worker)
+_worker_overlay = None
+_worker_shm = None
+_worker_cancel = None
+
+def process_tile_job(job, overlay_rgba=None, writer=None, dry_run=False):
+    """Computes one output tile and hands it to the writer (nothing is written on a dry run).
+    Returns (filename, error or None, written, report) where written is False for unchanged
+    tiles and report is the tile's change report (see apply_report)."""
+    filename = job['filename']
+    try:
+        if job['kind'] == 'overlay':
+            output_tile = apply_overlay_to_tile(
+                job['current_image'], job['original_image'], overlay_rgba,
+                job['tile_pos'], job['overlay_origin'],
+                job['transparency_color'], job['tolerance'], job['invert'], job['opacity'],
+                job.get('region')
+            )
+        else:
+            output_tile = apply_palette_to_tile(
+                job['current_image'], job['original_image'],
+                job['transparency_color'], job['tolerance'], job['invert']
+            )
+        report = tile_change_report(filename, output_tile, job['original_image'],
+                                    job['transparency_color'], job['tolerance'], job['invert'])
+        if dry_run:
+            return filename, None, False, report
+        if writer is None:
+            output_tile.save(filename)
+            return filename, None, True, report
+        return filename, None, writer.write(filename, output_tile), report
+    except Exception as e:
+        logging.error(f"Tile proc error '{filename}': {e}", exc_info=True)
+        return filename, str(e), False, None
+
+def _run_with_writer(jobs, overlay_rgba, writer, progress=None, cancel_event=None, dry_run=False):
+    """Processes jobs in order, stopping between tiles once cancel_event is set.
+    Cancelled jobs have no entry in the returned results."""
+    results = []
+    for job in jobs:
+        if cancel_event is not None and cancel_event.is_set(): break
+        results.append(process_tile_job(job, overlay_rgba, writer, dry_run))
+        if progress: progress(len(results), len(jobs), writer.bytes_written)
+    writer.flush()
+    if writer.errors:
+        # Failures at rename/fsync time are only known after the batch flush
+        results = [(fname, writer.errors[fname], False, report) if fname in writer.errors else (fname, err, written, report)
+                   for fname, err, written, report in results]
+    return results
+
+def run_jobs_serial(jobs, overlay_rgba=None, progress=None, cancel_event=None, dry_run=False):
+    """Processes jobs one after another in the calling thread through one TileWriter."""
+    writer = TileWriter()
+    results = _run_with_writer(jobs, overlay_rgba, writer, progress, cancel_event, dry_run)
+    logging.info(f"Write-back: {writer.written_count} written ({writer.bytes_written} bytes), {writer.skipped_count} unchanged.")
+    return results
+
+def _init_worker(shm_name, shape, cancel_event=None):
+    """Pool initializer: maps the shared overlay once per worker process."""
+    global _worker_overlay, _worker_shm, _worker_cancel
+    _worker_cancel = cancel_event
+    if shm_name:
+        _worker_shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_overlay = np.ndarray(shape, dtype=np.uint8, buffer=_worker_shm.buf)
+
+def _process_job_chunk(jobs, dry_run=False):
+    """Returns (results, bytes written) for one chunk."""
+    writer = TileWriter()
+    results = _run_with_writer(jobs, _worker_overlay, writer, cancel_event=_worker_cancel, dry_run=dry_run)
+    logging.debug(f"Write-back chunk: {writer.written_count} written ({writer.bytes_written} bytes), {writer.skipped_count} unchanged.")
+    return results, writer.bytes_written
+
+def _chunk(jobs, chunk_count):
+    size = max(1, -(-len(jobs) // chunk_count))
+    return [jobs[i:i+size] for i in range(0, len(jobs), size)]
+
+def default_worker_count():
+    return max(1, os.cpu_count() or 1)
+
+def run_jobs_parallel(jobs, overlay_rgba=None, max_workers=None, progress=None, cancel_event=None, dry_run=False):
+    """Spreads jobs over a process pool. The overlay is published once via shared
+    memory instead of being pickled with every job; encoding and write-back run in the workers.
+    Progress is reported per finished chunk; cancel_event is forwarded to the workers,
+    which stop between tiles. Workers are spawned, not forked: this runs on a worker thread of the
+    Tk process, and a forked child would inherit Tk/Xlib and logging locks held by other threads."""
+    max_workers = max_workers or default_worker_count()
+    shm = None
+    try:
+        shm_name, shape = None, None
+        if overlay_rgba is not None:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, overlay_rgba.nbytes))
+            np.ndarray(overlay_rgba.shape, dtype=np.uint8, buffer=shm.buf)[...] = overlay_rgba
+            shm_name, shape = shm.name, overlay_rgba.shape
+        context = multiprocessing.get_context("spawn"); worker_cancel = context.Event()
+        results = []; bytes_written = 0
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker, initargs=(shm_name, shape, worker_cancel)) as pool:
+            pending = {pool.submit(_process_job_chunk, chunk, dry_run) for chunk in _chunk(jobs, max_workers * JOBS_PER_WORKER)}
+            while pending:
+                done, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                if cancel_event is not None and cancel_event.is_set() and not worker_cancel.is_set():
+                    worker_cancel.set()
+                    for future in pending: future.cancel()
+                for future in done:
+                    if future.cancelled(): continue
+                    chunk_results, chunk_bytes = future.result()
+                    results.extend(chunk_results); bytes_written += chunk_bytes
+                    if progress: progress(len(results), len(jobs), bytes_written)
+        logging.info(f"Write-back: {sum(1 for r in results if r[2])} written ({bytes_written} bytes), {len(results)} tile(s) processed.")
+        return results
+    finally:
+        if shm is not None:
+            shm.close(); shm.unlink()
+
+def run_jobs(jobs, overlay_rgba=None, parallel=False, max_workers=None, progress=None, cancel_event=None, dry_run=False):
+    """Runs jobs in the pool when it pays off, otherwise serially. A dry run computes
+    every tile and its change report but writes nothing.
+    progress(done, total, bytes_written) is called from the running thread; once
+    cancel_event is set the run stops between tiles and returns what was finished."""
+    if parallel and len(jobs) >= PARALLEL_MIN_TILES and (max_workers or default_worker_count()) > 1:
+        try:
+            logging.info(f"Apply: Parallel run of {len(jobs)} tiles on {max_workers or default_worker_count()} workers.")
+            return run_jobs_parallel(jobs, overlay_rgba, max_workers, progress, cancel_event, dry_run)
+        except Exception as e:
+            # A broken pool (e.g. frozen build without freeze_support) must not lose the apply
+            logging.error(f"Parallel apply failed, falling back to serial: {e}", exc_info=True)
+    return run_jobs_serial(jobs, overlay_rgba, progress, cancel_event, dry_run)
@@ -91,7 +91,7 @@ class AlignmentHandler:
         try:
             item['data']['x'] = x
             item['data']['y'] = y
-            self.view.canvas.coords(item['id'], x, y)
+            self.view.canvas.coords(item['id'], *self.view.world_to_canvas(x, y))
         except Exception as e:
             logging.error(f"Error updating item position: {e}", exc_info=True)
 
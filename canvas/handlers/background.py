@@ -5,6 +5,8 @@ from PIL import Image, ImageTk
 import logging
 import os
 
+from ..keying import apply_key, parse_key
+
 try: LANCZOS_RESAMPLE = Image.Resampling.LANCZOS
 except AttributeError: LANCZOS_RESAMPLE = Image.LANCZOS;
 
@@ -19,50 +21,14 @@ class BackgroundHandler:
             if not color:
                 return image
 
-            # Convert hex color to RGB if it's a string
-            if isinstance(color, str):
-                color = color.lstrip('#')
-                color = tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
-
-            # Convert image to RGBA if it isn't already
-            if image.mode != 'RGBA':
-                image = image.convert('RGBA')
-
-            # Get image data
-            data = image.getdata()
-            new_data = []
-
             # Get tolerance value from canvas window
             tolerance = 0
             if hasattr(self.view, 'app') and hasattr(self.view.app, 'tolerance_value'):
                 tolerance = self.view.app.tolerance_value.get()
 
-            # Process each pixel
-            for item in data:
-                # Get RGB and alpha components
-                r, g, b = item[:3]
-                alpha = item[3] if len(item) > 3 else 255
-
-                # Check if pixel matches transparency color within tolerance
-                matches = all(abs(item[i] - color[i]) <= tolerance for i in range(3))
-
-                if invert:
-                    # In invert mode: ONLY matching pixels remain visible
-                    if matches:
-                        new_data.append((r, g, b, alpha))  # Keep matching pixels visible
-                    else:
-                        new_data.append((r, g, b, 0))  # Make everything else transparent
-                else:
-                    # In normal mode: matching pixels become transparent
-                    if matches:
-                        new_data.append((r, g, b, 0))  # Make matching pixels transparent
-                    else:
-                        new_data.append((r, g, b, alpha))  # Keep non-matching pixels as they are
-
-            # Create new image with updated data
-            new_image = Image.new('RGBA', image.size)
-            new_image.putdata(new_data)
-            return new_image
+            # Whole-array keying: in normal mode matching pixels become transparent,
+            # in invert mode ONLY matching pixels remain visible
+            return apply_key(image, *parse_key(color, tolerance), invert)
 
         except Exception as e:
             logging.error(f"Error applying transparency: {e}", exc_info=True)
@@ -73,9 +39,8 @@ class BackgroundHandler:
         view = self.view
         try:
             logging.info(f"Setting transparency color: {color_hex}")
-            color_hex = color_hex.lstrip('#')
-            if len(color_hex) != 6:
-                raise ValueError("Hex color must be 6 digits")
+            color_hex = color_hex.strip().lstrip('#')
+            parse_key(color_hex) # Raises ValueError; several comma separated colors form a key set
             
             # Store the transparency color
             view.transparency_color = color_hex
@@ -111,7 +76,7 @@ class BackgroundHandler:
                     img_coords = view.canvas.coords(item_id)
                     if img_coords:
                         # Map canvas click coords back to original image coords
-                        bbox = view.canvas.bbox(item_id)
+                        bbox = view.tile_renderer.bbox(item_id)
                         if bbox and (bbox[2]-bbox[0])>0 and (bbox[3]-bbox[1])>0:
                              prop_x = (canvas_x - bbox[0]) / (bbox[2] - bbox[0]); prop_y = (canvas_y - bbox[1]) / (bbox[3] - bbox[1])
                              original_image = clicked_image_info["image"]
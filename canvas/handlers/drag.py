@@ -130,7 +130,7 @@ class DragHandler:
         mx1, my1, mx2, my2 = moved_bbox
         for other_item_id in other_item_ids:
             if not view.canvas.find_withtag(other_item_id): continue
-            other_bbox = view.canvas.bbox(other_item_id);
+            other_bbox = view.tile_renderer.bbox(other_item_id);
             if not other_bbox: continue
             ox1, oy1, ox2, oy2 = other_bbox
             is_overlapping = not (mx2 <= ox1 or mx1 >= ox2 or my2 <= oy1 or my1 >= oy2)
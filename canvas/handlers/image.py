@@ -15,7 +15,7 @@ class ImageHandler:
             tk_image = ImageTk.PhotoImage(pil_image)
             
             # Keep reference to prevent garbage collection
-            self.canvas_window.tk_images.append(tk_image)
+            self.canvas_window.photo_registry.put((image_path, 'tile'), tk_image)
             
             # Determine z-index based on layer_behind setting
             if self.canvas_window.layer_behind:
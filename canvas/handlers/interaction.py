@@ -48,7 +48,7 @@ class InteractionHandler:
             # *** Always prepare drag state AFTER selection logic ***
             self._prepare_drag(event, clicked_item_id, canvas_x, canvas_y)
         else: # Clicked empty space
-            if not mod: self.clear_selection_visuals(); view.selected_item_ids.clear()
+            if not mod: self.clear_selection_visuals(); view.selected_item_ids.clear(); view.tile_renderer.sync_promoted()
             self._reset_drag_state() # Reset item drag state
 
     def handle_ctrl_click(self, event):
@@ -112,18 +112,17 @@ class InteractionHandler:
                 # Move the item by the delta
                 self.view.canvas.move(item_id, dx, dy)
                 
-                # Update the stored coordinates
+                # Update the stored (world) coordinates
                 coords = self.view.canvas.coords(item_id)
                 if coords:
                     for filename, data in self.view.images.items():
                         if data['id'] == item_id:
-                            data['x'] = coords[0]
-                            data['y'] = coords[1]
+                            data['x'], data['y'] = self.view.canvas_to_world(coords[0], coords[1])
                             break
 
                 # Update selection outline
                 if item_id in self.selection_outline_ids:
-                    bbox = self.view.canvas.bbox(item_id)
+                    bbox = self.view.tile_renderer.bbox(item_id)
                     if bbox:
                         self.view.canvas.coords(
                             self.selection_outline_ids[item_id],
@@ -171,8 +170,9 @@ class InteractionHandler:
                     if view.canvas.find_withtag(item_id):
                         coords = view.canvas.coords(item_id)
                         if coords:
-                            x = int(round(coords[0]))
-                            y = int(round(coords[1]))
+                            world_x, world_y = view.canvas_to_world(coords[0], coords[1])
+                            x = int(round(world_x))
+                            y = int(round(world_y))
                             final_coords_map[item_id] = (x, y)
                             self._update_item_stored_coords(item_id, x, y)
 
@@ -200,7 +200,7 @@ class InteractionHandler:
         mx1, my1, mx2, my2 = moved_bbox
         for other_item_id in other_item_ids:
             if not view.canvas.find_withtag(other_item_id): continue
-            other_bbox = view.canvas.bbox(other_item_id);
+            other_bbox = view.tile_renderer.bbox(other_item_id);
             if not other_bbox: continue
             ox1, oy1, ox2, oy2 = other_bbox
             is_overlapping = not (mx2 <= ox1 or mx1 >= ox2 or my2 <= oy1 or my1 >= oy2)
@@ -220,7 +220,7 @@ class InteractionHandler:
                     logging.info(f"Overlap push {moved_item_id} ({push_dx:.0f},{push_dy:.0f})")
                     view.canvas.move(moved_item_id, push_dx, push_dy)
                     coords_after_push = view.canvas.coords(moved_item_id)
-                    if coords_after_push: self._update_item_stored_coords(moved_item_id, round(coords_after_push[0]), round(coords_after_push[1]))
+                    if coords_after_push: self._update_item_stored_coords(moved_item_id, *view.canvas_to_world(coords_after_push[0], coords_after_push[1]))
                     moved_bbox = view.canvas.bbox(moved_item_id);
                     if not moved_bbox: logging.error("Item vanished!"); return
                     mx1, my1, mx2, my2 = moved_bbox
@@ -243,7 +243,7 @@ class InteractionHandler:
             sx=self.box_select_data["start_x"]; sy=self.box_select_data["start_y"]; ex=view.canvas.canvasx(event.x); ey=view.canvas.canvasy(event.y)
             x1=min(sx,ex); y1=min(sy,ey); x2=max(sx,ex); y2=max(sy,ey)
             view.canvas.delete(rect_id)
-            selected_ids = view.canvas.find_enclosed(x1, y1, x2, y2)
+            selected_ids = [*view.canvas.find_enclosed(x1, y1, x2, y2), *view.tile_renderer.hidden_tiles_in(x1, y1, x2, y2, enclosed=True)]
             view.selected_item_ids = {item_id for item_id in selected_ids if "draggable" in view.canvas.gettags(item_id)}
             self.update_selection_visuals()
             logging.info(f"Box selected {len(view.selected_item_ids)} items.")
@@ -251,16 +251,18 @@ class InteractionHandler:
 
     # --- Selection Visuals ---
     def _add_selection_visual(self, item_id):
-        view=self.view;
+        view=self.view; view.tile_renderer.sync_promoted() # Selected tiles leave the raster so their outline/drag work
         if item_id in self.selection_outline_ids: return
-        bbox=view.canvas.bbox(item_id);
+        bbox=view.tile_renderer.bbox(item_id);
         if bbox: x1,y1,x2,y2=bbox;
         if x2-x1>=1 and y2-y1>=1: outline_id=view.canvas.create_rectangle(x1,y1,x2,y2,outline="green",width=1,tags=("selection_outline",f"outline_{item_id}")); self.selection_outline_ids[item_id]=outline_id; view.canvas.tag_raise(outline_id)
     def _remove_selection_visual(self, item_id):
          view = self.view; outline_id = self.selection_outline_ids.pop(item_id, None);
          if outline_id and view.canvas.find_withtag(outline_id): view.canvas.delete(outline_id)
+         view.tile_renderer.sync_promoted()
     def update_selection_visuals(self):
          view=self.view; current=set(self.selection_outline_ids.keys()); selected=view.selected_item_ids
+         view.tile_renderer.sync_promoted()
          for item_id in (current-selected): self._remove_selection_visual(item_id)
          for item_id in (selected-current):
              if view.canvas.find_withtag(item_id): self._add_selection_visual(item_id)
@@ -269,7 +271,7 @@ class InteractionHandler:
          view=self.view;
          for item_id, outline_id in self.selection_outline_ids.items():
              if view.canvas.find_withtag(item_id) and view.canvas.find_withtag(outline_id):
-                 bbox = view.canvas.bbox(item_id);
+                 bbox = view.tile_renderer.bbox(item_id);
                  if bbox: view.canvas.coords(outline_id, bbox[0], bbox[1], bbox[2], bbox[3])
     def clear_selection_visuals(self):
         view=self.view;
@@ -286,7 +288,7 @@ class InteractionHandler:
         try:
             current_coords = view.canvas.coords(item_id);
             if not current_coords: return
-            current_x, current_y = current_coords
+            current_x, current_y = view.canvas_to_world(current_coords[0], current_coords[1]) # Grid is in world units
             ideal_snap_x, ideal_snap_y = current_x, current_y
             if grid_type == "pixel":
                 step = grid_info.get("step");
@@ -305,7 +307,7 @@ class InteractionHandler:
             delta_x=final_snap_x-int(round(current_x)); delta_y=final_snap_y-int(round(current_y))
             if delta_x != 0 or delta_y != 0:
                 # logging.info(f"Snapping Item {item_id} to int pos ({final_snap_x},{final_snap_y})") # Can be verbose
-                view.canvas.move(item_id, delta_x, delta_y)
+                view.canvas.move(item_id, *view.world_to_canvas(delta_x, delta_y))
                 self._update_item_stored_coords(item_id, final_snap_x, final_snap_y)
             else:
                 # logging.debug(f"Item {item_id} already snapped int pos ({final_snap_x},{final_snap_y}).")
@@ -348,7 +350,10 @@ class InteractionHandler:
     def _find_draggable_item_canvas(self, canvas_x, canvas_y):
         view = self.view; item_ids = view.canvas.find_overlapping(canvas_x-1, canvas_y-1, canvas_x+1, canvas_y+1)
         for item_id in reversed(item_ids):
-            if "draggable" in view.canvas.gettags(item_id): return item_id
+            tags = view.canvas.gettags(item_id)
+            if "draggable" in tags: return item_id
+            if "composite" in tags: return view.tile_renderer.tile_at(canvas_x, canvas_y) # Tiles drawn into the raster/LOD image
+            if "tile_crop" in tags: return view.tile_renderer.crop_owner(item_id) # Visible part of a zoomed-in tile
         return None
     def _reset_drag_state(self):
          self.drag_data = {
@@ -360,6 +365,7 @@ class InteractionHandler:
          self.drag_start_positions.clear()
          # DO NOT reset pan_data here
     def _update_item_stored_coords(self, item_id, new_x, new_y):
+         """Stores an item's position. new_x/new_y are world (1.0x) coordinates."""
          view = self.view; int_x = int(round(new_x)); int_y = int(round(new_y))
          # Clamp coordinates to world bounds before storing
          max_x = view.canvas_world_width if hasattr(view, 'canvas_world_width') else float('inf')
@@ -388,7 +394,7 @@ class InteractionHandler:
         if item_id in self.selection_outline_ids:
              view=self.view; outline_id = self.selection_outline_ids[item_id]
              if view.canvas.find_withtag(item_id) and view.canvas.find_withtag(outline_id):
-                 bbox = view.canvas.bbox(item_id);
+                 bbox = view.tile_renderer.bbox(item_id);
                  if bbox: x1,y1,x2,y2=bbox;
                  if x2-x1>=1 and y2-y1>=1: view.canvas.coords(outline_id,x1,y1,x2,y2)
                  else: view.canvas.coords(outline_id,-1,-1,-1,-1) # Hide
@@ -396,7 +402,7 @@ class InteractionHandler:
          view=self.view;
          for item_id, outline_id in self.selection_outline_ids.items():
              if view.canvas.find_withtag(item_id) and view.canvas.find_withtag(outline_id):
-                 bbox = view.canvas.bbox(item_id);
+                 bbox = view.tile_renderer.bbox(item_id);
                  if bbox: view.canvas.coords(outline_id, bbox[0], bbox[1], bbox[2], bbox[3])
     def clear_selection_visuals(self):
         view=self.view;
@@ -407,7 +413,7 @@ class InteractionHandler:
         """Adjusts item position slightly if it's dragged outside world bounds."""
         view = self.view
         try:
-            coords = view.canvas.coords(item_id); bbox = view.canvas.bbox(item_id)
+            coords = view.canvas.coords(item_id); bbox = view.tile_renderer.bbox(item_id)
             if not coords or not bbox: return
             current_x, current_y = coords; item_w = bbox[2] - bbox[0]; item_h = bbox[3] - bbox[1]
             # Get world bounds at current scale
@@ -421,7 +427,7 @@ class InteractionHandler:
                 # logging.debug(f"Clamping item {item_id} by ({dx:.1f},{dy:.1f}) canvas coords")
                 view.canvas.move(item_id, dx, dy)
                 # Update stored coordinates AFTER clamping
-                self._update_item_stored_coords(item_id, clamped_x, clamped_y)
+                self._update_item_stored_coords(item_id, *view.canvas_to_world(clamped_x, clamped_y))
         except Exception as e: logging.error(f"Error clamping item {item_id}: {e}", exc_info=True)
 
     def _start_drag(self, event):
@@ -466,13 +472,7 @@ class InteractionHandler:
             self._update_stored_positions()
 
     def _update_stored_positions(self):
-        """Update stored positions after arrow key movements."""
+        """Update stored drag positions after arrow key movements (AlignmentHandler already wrote the integer world coords)."""
         for item_id in self.view.selected_item_ids:
             coords = self.view.canvas.coords(item_id)
-            if coords:
-                self.drag_start_positions[item_id] = coords
-                for filename, data in self.view.images.items():
-                    if data['id'] == item_id:
-                        data['x'] = coords[0]
-                        data['y'] = coords[1]
-                        break
\ No newline at end of file
+            if coords: self.drag_start_positions[item_id] = coords
\ No newline at end of file
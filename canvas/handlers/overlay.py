@@ -1,9 +1,10 @@
 # --- canvas/handlers/overlay.py ---
 import tkinter as tk
 from tkinter import messagebox
-from PIL import Image, ImageTk, ImageGrab
+from PIL import Image, ImageGrab
 import logging
 import os
+from ..tkimage import to_photo
 
 try: LANCZOS_RESAMPLE = Image.Resampling.LANCZOS
 except AttributeError: LANCZOS_RESAMPLE = Image.LANCZOS;
@@ -13,12 +14,10 @@ class OverlayHandler:
         self.view = canvas_view
 
     def paste_from_clipboard(self):
-        """Grabs image, resets zoom, adds overlay at appropriate origin."""
+        """Grabs image, adds overlay at appropriate origin (world coords, any zoom)."""
         view = self.view
         try:
             logging.info("Overlay Paste: Attempting...")
-            if hasattr(view, 'reset_zoom'): view.reset_zoom()
-
             image = ImageGrab.grabclipboard()
             if isinstance(image, Image.Image):
                 view.pasted_overlay_pil_image = image.convert("RGBA")
@@ -27,7 +26,7 @@ class OverlayHandler:
                 if view.pasted_overlay_item_id and view.canvas.find_withtag(view.pasted_overlay_item_id): view.canvas.delete(view.pasted_overlay_item_id)
                 view.pasted_overlay_item_id = None; view.pasted_overlay_tk_image = None
 
-                view.pasted_overlay_tk_image = ImageTk.PhotoImage(view.pasted_overlay_pil_image)
+                view.pasted_overlay_tk_image = to_photo(view.scale_for_view(view.pasted_overlay_pil_image), view.canvas); view._overlay_source = view.pasted_overlay_pil_image
 
                 # *** Determine Paste Position ***
                 if view.last_capture_origin is not None:
@@ -42,7 +41,7 @@ class OverlayHandler:
                 # Store the placement coords as the CURRENT offset
                 view.pasted_overlay_offset = (initial_x, initial_y)
 
-                view.pasted_overlay_item_id = view.canvas.create_image(initial_x, initial_y, anchor="nw", image=view.pasted_overlay_tk_image, tags=("draggable", "pasted_overlay"))
+                view.pasted_overlay_item_id = view.canvas.create_image(*view.world_to_canvas(initial_x, initial_y), anchor="nw", image=view.pasted_overlay_tk_image, tags=("draggable", "pasted_overlay"))
 
                 # --- Overlay stacking order ---
                 overlay_behind = False
@@ -54,6 +53,7 @@ class OverlayHandler:
                 else:
                     # Raise overlay above all
                     view.canvas.tag_raise(view.pasted_overlay_item_id)
+                view.tile_renderer.restack()
                 # --- End stacking order ---
 
                 logging.info(f"Overlay Paste: Displayed ID: {view.pasted_overlay_item_id} at ({initial_x},{initial_y}).")
@@ -11,41 +11,17 @@ class TileHandler:
     def add_tile(self, image, filename, x=0, y=0):
         """Add a tile to the canvas, accounting for scroll position."""
         try:
-            # Convert screen coordinates to canvas coordinates
-            canvas_x = int(round(self.view.canvas.canvasx(x)))
-            canvas_y = int(round(self.view.canvas.canvasy(y)))
-            
-            # Create display version of image
-            display_image = image.copy()
-            if self.view.transparency_color:
-                hex_color = self.view.transparency_color.lstrip('#')
-                color_tuple = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                display_image = self.view.bg_handler.apply_transparency(
-                    display_image,
-                    color_tuple,
-                    invert=self.view.app.invert_transparency.get() if hasattr(self.view.app, 'invert_transparency') else False
-                )
-            
-            # Create Tkinter image and add to canvas
-            tk_image = ImageTk.PhotoImage(display_image)
-            self.view.tk_images.append(tk_image)
-            
-            # Create canvas item
-            item_id = self.view.canvas.create_image(
-                canvas_x, canvas_y,
-                image=tk_image,
-                anchor="nw",
-                tags=("draggable", filename)
-            )
+            # Convert screen coordinates to canvas coordinates, then to world coordinates
+            canvas_x = self.view.canvas.canvasx(x); canvas_y = self.view.canvas.canvasy(y)
+            world_x, world_y = (int(round(v)) for v in self.view.canvas_to_world(canvas_x, canvas_y))
             
             # Store image data
-            self.view.images[filename] = {
-                'image': image,
-                'id': item_id,
-                'x': canvas_x,
-                'y': canvas_y,
-                'z_index': self.view.next_z_index
-            }
+            data = {'image': image, 'id': None, 'x': world_x, 'y': world_y, 'z_index': self.view.next_z_index}
+            
+            # Create the canvas item culled, then render it if it is in view
+            item_id = self.view.tile_renderer.create_item(filename, data)
+            self.view.images[filename] = data
+            self.view.tile_renderer.show(filename)
             
             # Update z-index
             self.view.next_z_index += 1
@@ -67,6 +43,7 @@ class TileHandler:
                 item_id = self.view.images[filename]['id']
                 if self.view.canvas.find_withtag(item_id):
                     self.view.canvas.delete(item_id)
+                self.view.key_mask_cache.discard(self.view.images[filename]); self.view.scaled_image_cache.discard(self.view.images[filename]); self.view.tile_renderer.forget(filename)
                 del self.view.images[filename]
                 
                 # Update layers window if it exists
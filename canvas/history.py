@@ -77,8 +77,7 @@ class HistoryManager:
     def _restore_state(self, canvas_window, state: HistoryState):
         """Restore canvas to given state."""
         try:
-            # Clear current canvas state
-            canvas_window.canvas.delete("all")
+            # Clear current canvas state (redraw_canvas reuses the items whose ids survive in the state)
             canvas_window.images.clear()
             canvas_window.selected_item_ids.clear()
             
@@ -0,0 +1,108 @@
+# --- canvas/keydetect.py ---
+import json
+import logging
+import os
+import numpy as np
+
+from .palette import lookup, palette_rgba, to_rgba
+
+BORDER_WIDTH = 2 # Pixels sampled along each edge
+CORNER_SIZE = 4 # Corner blocks are counted once more on top of the border
+TOP_COLORS_KEPT = 32 # Histogram entries kept per tile (and in the cache file)
+MAX_TOLERANCE = 64 # Same range as the tolerance slider
+VARIANT_MIN_SHARE = 0.02 # Near-key colors at least this common (vs. the key) count as its anti-aliased variants
+
+def _pack(rgb):
+    return (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+
+def _unpack(packed):
+    return np.stack([(packed >> 16) & 255, (packed >> 8) & 255, packed & 255], axis=-1).astype(np.uint8)
+
+def _edge_samples(values, border=BORDER_WIDTH, corner=CORNER_SIZE):
+    """Border strips plus corner blocks of an (h, w, ...) array, flattened to (n, ...)."""
+    h, w = values.shape[:2]; b = min(border, h, w); c = min(corner, h, w)
+    parts = [values[:b], values[h-b:], values[b:h-b, :b], values[b:h-b, w-b:],
+             values[:c, :c], values[:c, w-c:], values[h-c:, :c], values[h-c:, w-c:]]
+    return np.concatenate([p.reshape(-1, *values.shape[2:]) for p in parts])
+
+def border_histogram(image):
+    """Opaque border/corner colors of a tile: list of [r, g, b, count], most common first."""
+    if image.mode == 'P':
+        # Count palette indices, then resolve the <=256 entries through the palette
+        indices, counts = np.unique(_edge_samples(np.asarray(image, dtype=np.uint8)), return_counts=True)
+        table = palette_rgba(image)[indices]
+        opaque = table[:, 3] > 0
+        packed, counts = _pack(table[opaque, :3]), counts[opaque]
+        packed, inverse = np.unique(packed, return_inverse=True); counts = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
+    else:
+        samples = _edge_samples(np.asarray(to_rgba(image), dtype=np.uint8))
+        packed, counts = np.unique(_pack(samples[samples[:, 3] > 0, :3]), return_counts=True)
+    order = np.argsort(-counts, kind='stable')[:TOP_COLORS_KEPT]
+    return [[*map(int, rgb), int(n)] for rgb, n in zip(_unpack(packed[order]), counts[order])]
+
+def propose_key_color(histograms):
+    """Most likely key color over all tiles and a tolerance covering its anti-aliased variants.
+    Each tile votes with its border color shares, so large tiles don't dominate.
+    Returns ((r, g, b), tolerance, share of tiles' borders it covers) or None."""
+    scores = {}
+    for histogram in histograms:
+        total = sum(entry[3] for entry in histogram)
+        for r, g, b, n in histogram: scores[(r, g, b)] = scores.get((r, g, b), 0.0) + n / total
+    if not scores: return None
+    colors = np.array(list(scores), dtype=np.int16); weights = np.array(list(scores.values()))
+    key = colors[weights.argmax()]
+    distance = np.abs(colors - key).max(axis=1)
+    variants = (distance <= MAX_TOLERANCE) & (weights >= weights.max() * VARIANT_MIN_SHARE)
+    tolerance = int(distance[variants].max())
+    share = float(weights[distance <= tolerance].sum() / len(histograms))
+    return tuple(int(v) for v in key), tolerance, share
+
+def default_cache_path():
+    """key_color_cache.json in the per-user cache dir (LOCALAPPDATA on Windows, XDG_CACHE_HOME or ~/.cache elsewhere)."""
+    root = os.environ.get("LOCALAPPDATA") if os.name == "nt" else os.environ.get("XDG_CACHE_HOME")
+    return os.path.join(root or os.path.join(os.path.expanduser("~"), ".cache"), "CanvasToImages", "key_color_cache.json")
+
+class KeyColorCache:
+    """Border histograms of tile files as stored on disk, persisted as JSON and validated by file mtime and size."""
+    def __init__(self, path=None):
+        self.path = path = path or default_cache_path(); self.entries = {}; self.dirty = False
+        try:
+            if os.path.exists(path):
+                with open(path, "r") as f: self.entries = json.load(f)
+        except Exception as e: logging.warning(f"Ignoring unreadable key color cache {path}: {e}"); self.entries = {}
+
+    @staticmethod
+    def _stamp(filename):
+        try: st = os.stat(filename); return [st.st_mtime_ns, st.st_size]
+        except OSError: return None
+
+    def histogram(self, filename, image, unchanged=True):
+        """Cached border_histogram of the tile, computed from image on a miss. unchanged=False (image edited
+        or remapped in memory, so it no longer matches the file) bypasses the cache."""
+        if not unchanged: return border_histogram(image)
+        stamp = self._stamp(filename); entry = self.entries.get(filename)
+        if stamp and entry and entry.get("stamp") == stamp: return entry["colors"]
+        colors = border_histogram(image)
+        if stamp: self.entries[filename] = {"stamp": stamp, "colors": colors}; self.dirty = True
+        return colors
+
+    def save(self):
+        if not self.dirty: return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as f: json.dump(self.entries, f)
+            self.dirty = False
+        except Exception as e: logging.error(f"Error saving key color cache {self.path}: {e}", exc_info=True)
+
+def detect_key_color(tiles, cache=None):
+    """tiles: (filename, PIL image, unchanged) triples, unchanged telling whether the image still matches
+    the file on disk (only those use the cache). Safe to run off the Tk thread (images must not change
+    meanwhile). Returns propose_key_color() of their border histograms."""
+    histograms = []
+    for filename, image, unchanged in tiles:
+        try:
+            histogram = cache.histogram(filename, image, unchanged) if cache else border_histogram(image)
+            if histogram: histograms.append(histogram)
+        except Exception as e: logging.error(f"Key color detection failed for {filename}: {e}", exc_info=True)
+    if cache: cache.save()
+    return propose_key_color(histograms)
@@ -0,0 +1,191 @@
+# --- canvas/keying.py ---
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from PIL import Image
+
+from .palette import lookup, palette_rgba, to_rgba
+
+MASK_CACHE_BUDGET_BYTES = 64 * 1024 * 1024
+
+def parse_hex_color(color):
+    """Converts '#rrggbb' (or an RGB tuple) to an (r, g, b) tuple. None stays None."""
+    if not color: return None
+    if isinstance(color, str):
+        color = color.lstrip('#')
+        return tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
+    return tuple(int(c) for c in color[:3])
+
+class KeySet:
+    """Several key colors, each with its own tolerance. Matching is a single gather per pixel in a
+    2**24-bit membership table of every color within tolerance of any key, compiled once per set."""
+    def __init__(self, entries):
+        self.entries = tuple((tuple(int(c) for c in color[:3]), int(tolerance)) for color, tolerance in entries)
+
+    def __len__(self): return len(self.entries)
+    def __eq__(self, other): return isinstance(other, KeySet) and self.entries == other.entries
+    def __hash__(self): return hash(self.entries)
+    def __repr__(self): return f"KeySet({list(self.entries)})"
+
+    @property
+    def primary(self): return self.entries[0][0]
+
+    def matches(self, rgba):
+        """Boolean (...) mask of pixels within tolerance of any key; rgba is (..., 3 or 4) uint8."""
+        packed = (rgba[..., 0].astype(np.uint32) << 16) | (rgba[..., 1].astype(np.uint32) << 8) | rgba[..., 2]
+        return ((_key_membership_table(self.entries)[packed >> 3] >> (packed & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def fill_colors(self, rgba):
+        """(..., 3) uint8 key color per pixel: the first key the pixel is within tolerance of,
+        the primary key for pixels matching none (keyed only with invert)."""
+        fill = np.empty(rgba.shape[:-1] + (3,), dtype=np.uint8); fill[:] = self.primary
+        done = np.zeros(rgba.shape[:-1], dtype=bool)
+        for color, tolerance in self.entries:
+            hit = ~done & (key_distance(rgba, color) <= tolerance)
+            fill[hit] = color; done |= hit
+        return fill
+
+@lru_cache(maxsize=8)
+def _key_membership_table(entries):
+    """np.packbits table (2 MB, little bit order) of every packed 0xRRGGBB color: bit set when the color is
+    within tolerance of any of entries. Each key is a box in RGB space, OR-ed in as one packed blue row."""
+    table = np.zeros((256, 256, 32), dtype=np.uint8)
+    for (r, g, b), tolerance in entries:
+        blue = np.zeros(256, dtype=bool); blue[max(b - tolerance, 0):b + tolerance + 1] = True
+        table[max(r - tolerance, 0):r + tolerance + 1, max(g - tolerance, 0):g + tolerance + 1] |= np.packbits(blue, bitorder='little')
+    return table.reshape(-1)
+
+def parse_key(spec, tolerance=0):
+    """Transparency key from a spec: '#rrggbb', an RGB tuple, or several '#rrggbb[:tolerance]'
+    separated by commas (tolerance defaults to the given one). Returns (key, tolerance) where key is
+    None, an (r, g, b) tuple for a single color, or a KeySet (tolerances compiled in)."""
+    if not spec: return None, tolerance
+    if not isinstance(spec, str): return parse_hex_color(spec), tolerance
+    entries = []
+    for item in spec.replace(';', ',').split(','):
+        if not item.strip(): continue
+        color, _, item_tolerance = item.strip().partition(':')
+        color = color.strip().lstrip('#')
+        if len(color) != 6: raise ValueError(f"Hex color must be 6 digits: '{item.strip()}'")
+        entries.append((parse_hex_color(color), int(item_tolerance) if item_tolerance.strip() else tolerance))
+    if not entries: return None, tolerance
+    if len(entries) == 1: return entries[0]
+    return KeySet(entries), 0
+
+def key_fill_colors(key, rgba):
+    """Opaque color keyed pixels are written back as: the key color, per pixel for a KeySet."""
+    return key.fill_colors(rgba) if isinstance(key, KeySet) else np.array(key, dtype=np.uint8)
+
+def key_distance(rgba, transparency_color):
+    """uint8 (h, w) distance of each pixel to the key color: the largest per-channel RGB difference.
+    A pixel matches the key at tolerance t exactly when its distance is <= t."""
+    diff = np.abs(rgba[..., :3].astype(np.int16) - np.array(transparency_color, dtype=np.int16))
+    return diff.max(axis=-1).astype(np.uint8)
+
+def image_key_distance(image, transparency_color):
+    """key_distance of a PIL image; for 'P' images computed on the palette and looked up per index."""
+    if image.mode == 'P': return lookup(image, key_distance(palette_rgba(image)[None], transparency_color)[0])
+    return key_distance(np.asarray(to_rgba(image), dtype=np.uint8), transparency_color)
+
+def image_key_mask(image, transparency_color, tolerance=0, invert=False):
+    """transparency_key_mask of a PIL image; for 'P' images computed on the palette and looked up per index."""
+    if image.mode == 'P': return lookup(image, transparency_key_mask(palette_rgba(image), transparency_color, tolerance, invert))
+    return transparency_key_mask(np.asarray(to_rgba(image), dtype=np.uint8), transparency_color, tolerance, invert)
+
+def transparency_key_mask(rgba, transparency_color, tolerance=0, invert=False):
+    """Boolean (h, w) mask of keyed pixels: the ones that end up transparent.
+    A pixel matches when every RGB channel is within tolerance of the key color;
+    normally matches are keyed, with invert everything else is."""
+    if transparency_color is None:
+        return np.zeros(rgba.shape[:-1], dtype=bool)
+    if isinstance(transparency_color, KeySet): matches = transparency_color.matches(rgba)
+    else: matches = key_distance(rgba, transparency_color) <= tolerance
+    return ~matches if invert else matches
+
+def apply_key(image, transparency_color, tolerance=0, invert=False):
+    """RGBA copy of image with the alpha of keyed pixels set to 0; RGB and other alphas are kept."""
+    if image.mode == 'P':
+        table = palette_rgba(image) # Key the palette entries, then one lookup per pixel
+        table[transparency_key_mask(table, transparency_color, tolerance, invert), 3] = 0
+        return Image.fromarray(lookup(image, table), 'RGBA')
+    if image.mode != 'RGBA': image = image.convert('RGBA')
+    rgba = np.array(image, dtype=np.uint8)
+    return apply_mask(rgba, transparency_key_mask(rgba, transparency_color, tolerance, invert))
+
+def apply_mask(rgba, keyed):
+    """Zeroes alpha where keyed is True. rgba is an (h, w, 4) uint8 array (modified in place) or a PIL image."""
+    if isinstance(rgba, Image.Image): rgba = np.array(to_rgba(rgba), dtype=np.uint8)
+    rgba[..., 3][keyed] = 0
+    return Image.fromarray(rgba, 'RGBA')
+
+class KeyMaskCache:
+    """Per-tile cache of key-color match masks, LRU-evicted under a byte budget.
+    Masks are attached to the tile record (record['alpha_masks']) and keyed by
+    (source, color, tolerance, revision), where source names the record's image
+    ('image' or 'original_image'). Invert is just the complement of the same mask,
+    so toggling it never recomputes. Masks are thresholded from a cached key_distance
+    array (tolerance None in the key), so a new tolerance costs one compare.
+    Call bump_revision() when a record's images change."""
+    def __init__(self, budget_bytes=MASK_CACHE_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes; self.used_bytes = 0
+        self._lru = OrderedDict()  # (id(record), key) -> record, oldest first
+        self.hits = 0; self.misses = 0
+
+    @staticmethod
+    def bump_revision(record):
+        record['revision'] = record.get('revision', 0) + 1
+
+    def get(self, record, source, transparency_color, tolerance=0, invert=False):
+        """Boolean (h, w) mask of the keyed pixels of record[source]; transparency_color may be a KeySet."""
+        if isinstance(transparency_color, KeySet):
+            matches = self._lookup(record, source, transparency_color.entries, None,
+                                   lambda: image_key_mask(record[source], transparency_color))
+        else:
+            matches = self._lookup(record, source, tuple(transparency_color), int(tolerance),
+                                   lambda: self.distance(record, source, transparency_color) <= tolerance)
+        return ~matches if invert else matches
+
+    def distance(self, record, source, transparency_color):
+        """Cached key_distance array of record[source]."""
+        return self._lookup(record, source, tuple(transparency_color), None, lambda: image_key_distance(record[source], transparency_color))
+
+    def _lookup(self, record, source, color, tolerance, compute):
+        image = record[source]
+        key = (source, color, tolerance, record.get('revision', 0))
+        masks = record.setdefault('alpha_masks', {})
+        value = masks.get(key)
+        if value is not None and value.shape == (image.height, image.width):
+            self.hits += 1
+            self._lru.move_to_end((id(record), key))
+            return value
+        self.misses += 1
+        self._drop_stale(record, source, key)
+        value = compute()
+        masks[key] = value; self._lru[(id(record), key)] = record
+        self.used_bytes += value.nbytes
+        self._evict()
+        return value
+
+    def discard(self, record):
+        """Forgets all masks of a record (e.g. when the tile is removed)."""
+        for key in list(record.get('alpha_masks', {})): self._remove(record, key)
+
+    def clear(self):
+        for (_, key), record in list(self._lru.items()): self._remove(record, key)
+
+    def _drop_stale(self, record, source, current_key):
+        # Masks of older revisions of the same image can't be hit again
+        for key in [k for k in record.get('alpha_masks', {}) if k[0] == source and k[3] != current_key[3]]:
+            self._remove(record, key)
+
+    def _remove(self, record, key):
+        matches = record.get('alpha_masks', {}).pop(key, None)
+        if matches is not None: self.used_bytes -= matches.nbytes
+        self._lru.pop((id(record), key), None)
+
+    def _evict(self):
+        while self.used_bytes > self.budget_bytes and len(self._lru) > 1:
+            (_, key), record = next(iter(self._lru.items()))
+            self._remove(record, key)
+            logging.debug(f"Mask cache evicted {key[:3]}, {self.used_bytes} bytes in use.")
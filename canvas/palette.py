@@ -0,0 +1,45 @@
+# --- canvas/palette.py ---
+import numpy as np
+from PIL import Image
+
+# Indexed ('P') tiles stay indexed in memory. Per-colour work (keying, palette remap)
+# runs on the <=256 palette entries and is applied to the pixels as one index lookup.
+
+def palette_rgba(image):
+    """(256, 4) uint8 RGBA table of a 'P' image's palette, including tRNS transparency."""
+    ramp = Image.frombytes('P', (256, 1), bytes(range(256)))
+    if image.palette is not None:
+        mode = image.palette.mode; ramp.putpalette(image.getpalette(mode), mode)
+    if 'transparency' in image.info: ramp.info['transparency'] = image.info['transparency']
+    return np.array(ramp.convert('RGBA'), dtype=np.uint8)[0]
+
+def lookup(image, table):
+    """Per-pixel table[index] for a 'P' image; table has 256 entries along its first axis."""
+    return table[np.asarray(image, dtype=np.uint8)]
+
+def to_rgba(image):
+    """RGBA version of image; indexed images go through their palette table."""
+    if image.mode == 'RGBA': return image
+    if image.mode == 'P': return Image.fromarray(lookup(image, palette_rgba(image)), 'RGBA')
+    return image.convert('RGBA')
+
+def closest_palette_colors(colors, palette_colors):
+    """Closest palette color (Euclidean RGB distance, first wins on ties) for each (n, 3) color."""
+    palette = np.array(palette_colors)[:, :3]
+    dists = ((colors[:, None, :].astype(np.int64) - palette[None, :, :]) ** 2).sum(axis=-1)
+    return palette[dists.argmin(axis=1)]
+
+def remap_to_palette(image, palette_colors, transparency_color=None):
+    """Maps every pixel to its closest palette color (opaque); pixels exactly matching
+    transparency_color (or matching its KeySet) become (0, 0, 0, 0). Works per distinct color:
+    the palette entries of a 'P' image, the unique colors of anything else."""
+    from .keying import transparency_key_mask # keying builds on this module
+    if image.mode == 'P':
+        colors = palette_rgba(image)[:, :3]; indices = np.asarray(image, dtype=np.uint8)
+    else:
+        colors, indices = np.unique(np.asarray(image.convert('RGB'), dtype=np.uint8).reshape(-1, 3), axis=0, return_inverse=True)
+        indices = indices.reshape(image.height, image.width)
+    table = np.empty((len(colors), 4), dtype=np.uint8)
+    table[:, :3] = closest_palette_colors(colors, palette_colors); table[:, 3] = 255
+    table[transparency_key_mask(colors, transparency_color)] = 0
+    return Image.fromarray(table[indices], 'RGBA')
@@ -0,0 +1,581 @@
+# --- canvas/render.py ---
+import tkinter as tk
+import logging
+import queue
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+from .scalecache import native_factor
+from .tkimage import to_photo, update_photo
+
+VISIBILITY_MARGIN = 256 # Screen px around the viewport whose tiles are kept rendered
+VISIBILITY_DEBOUNCE_MS = 30 # Scroll/pan settles this long before tiles are (un)materialized
+LOD_MAX_SCALE = 0.5 # Below this zoom the view draws cached chunk composites instead of tiles
+LOD_CHUNK_SIZE = 1024 # World px per chunk side
+LOD_CACHE_BYTES = 128 * 1024 * 1024 # Downscaled chunk composites kept across zooms
+CROP_OVERSCAN = 128 # Screen px rendered around the viewport for tiles cropped when zoomed in
+ASYNC_POLL_MS = 15 # How often finished background renders are swapped in
+
+class TileRenderer:
+    """Materializes tile PhotoImages only for tiles inside the viewport (plus a margin).
+    Every tile keeps its canvas item; tiles out of view (culled) show no image at all, so they hold no
+    photo memory, and bbox()/hidden_tiles_in() report their extent from the stored world position.
+    In raster mode (set_raster_mode) tile items are hidden and the viewport is composited into
+    one image item instead; selected tiles are promoted back to their own visible items.
+    Below LOD_MAX_SCALE the same happens with ChunkLOD, which draws cached per-chunk composites.
+    Zoomed in, a tile larger than the viewport is cropped to what is in view (plus CROP_OVERSCAN)
+    before scaling: its item is hidden and a separate 'tile_crop' item shows the scaled crop."""
+    def __init__(self, view):
+        self.view = view
+        # Photos live in view.photo_registry: (filename, 'tile') -> scale it was rendered at (pinned),
+        # (filename, 'base') -> keyed 1x photo feeding native integer zoom (cached)
+        self.registry = view.photo_registry
+        self._update_job = None
+        self.raster = None # RasterLayer while raster mode is on
+        self.lod = ChunkLOD(self)
+        self.layer = None # Composited layer drawing the hidden tiles: lod, raster or None
+        self.hidden = set() # Tiles whose items are hidden (drawn by the composited layer instead)
+        self.culled = set() # Tiles out of view, whose items show no image
+        self.promoted = set() # Selected tiles shown as their own item while a layer is active
+        self.selected = set() # Selected tile names as of the last sync_promoted()
+        self.crops = {} # filename -> (crop item id, world crop box relative to the tile)
+        self.key_params = None # view._key_params() the tiles on screen were keyed with
+        # Progressive rendering: resampling runs on a worker thread, results are swapped in via after()
+        self.generation = 0; self._poll_job = None; self._worker = None
+        self.pending = {}; self._pending_epoch = None # filename -> revision resampling in the background, at (scale, key params)
+        self._jobs = queue.Queue(); self._results = queue.Queue()
+
+    # --- Visibility ---
+    def visible_world_rect(self, margin=VISIBILITY_MARGIN):
+        """(l, t, r, b) of the viewport plus margin screen px, in world coords."""
+        canvas = self.view.canvas; l = canvas.canvasx(0) - margin; t = canvas.canvasy(0) - margin
+        r = l + canvas.winfo_width() + 2 * margin; b = t + canvas.winfo_height() + 2 * margin
+        return (*self.view.canvas_to_world(l, t), *self.view.canvas_to_world(r, b))
+
+    @staticmethod
+    def intersects(data, rect):
+        w, h = data['image'].size; l, t, r, b = rect
+        return data['x'] < r and data['x'] + w > l and data['y'] < b and data['y'] + h > t
+
+    def schedule_update(self, *_):
+        """Debounced update(); also used as the canvas x/yscrollcommand, so any scroll, pan or zoom triggers it."""
+        if self._update_job: self.view.after_cancel(self._update_job)
+        self._update_job = self.view.after(VISIBILITY_DEBOUNCE_MS, lambda: self.update(progressive=True))
+
+    def update(self, force=False, progressive=False):
+        """Renders visible tiles that are missing or at another scale (all visible ones if force)
+        and releases tiles that left the viewport. Returns (rendered, released).
+        progressive: resample on the worker thread; until the results are swapped in, tiles keep
+        their current PhotoImages (at their new positions) as a coarse preview."""
+        self._update_job = None; view = self.view; todo = []
+        scale = view.current_scale_factor; rect = self.visible_world_rect(); rendered = released = 0
+        params = view._key_params()
+        if params != self.key_params: self.key_params = params; force = True # Key settings changed since the last pass
+        try:
+            layer = self.lod if scale < LOD_MAX_SCALE else self.raster
+            if layer is not self.layer:
+                if self.layer: self.layer.hide()
+                self.layer = layer; self.promoted.clear()
+            self.sync_promoted()
+            for filename, data in view.images.items():
+                if layer and filename not in self.promoted:
+                    self._drop_crop(filename); self.registry.release_owner(filename)
+                    self._set_hidden(filename, data, True) # Culled again on unhide
+                    continue
+                entry = self.registry.get((filename, 'tile'))
+                if self.intersects(data, rect) or filename in self.promoted:
+                    if force or entry is None or entry[1] != scale or not self._crop_covers(filename, data): todo.append((filename, data))
+                elif entry is not None: self.release(filename, data); released += 1
+                elif filename in self.hidden: self.release(filename, data)
+            if progressive: self._render_async(todo, scale)
+            else:
+                self._cancel_async() # Anything still resampling in the background is out of date
+                for filename, data in todo: self.render(filename, data, scale)
+            rendered = len(todo)
+            if layer: layer.update(force)
+        except Exception as e: logging.error(f"Tile visibility update error: {e}", exc_info=True)
+        if rendered or released: logging.debug(f"Visibility: {rendered} tile(s) rendered, {released} released; {self.registry.report()}.")
+        return rendered, released
+
+    # --- Per Tile ---
+    def render(self, filename, data, scale=None):
+        if scale is None: scale = self.view.current_scale_factor
+        box = self._crop_box(filename, data, scale); factor = native_factor(scale)
+        if factor: photo = self._native_scaled(filename, data, *factor, box=box)
+        elif box: photo = to_photo(self.scale_crop(self.view.keyed_image(data, 'image', 1.0, cached=True), box, scale), self.view.canvas)
+        else: photo = to_photo(self.view.keyed_image(data, 'image', scale, cached=True), self.view.canvas)
+        self._place(filename, data, scale, photo, box)
+
+    def _place(self, filename, data, scale, photo, box=None):
+        """Shows a rendered tile: on its own item, or on its crop item when box is given.
+        The photo it replaces is released once it is off screen."""
+        if not box:
+            self._drop_crop(filename)
+            self.view.canvas.itemconfig(data['id'], image=photo); self._set_hidden(filename, data, False)
+            self.culled.discard(filename); self.registry.put((filename, 'tile'), photo, scale); return
+        canvas = self.view.canvas; x, y = self.view.world_to_canvas(data['x'] + box[0], data['y'] + box[1])
+        crop = self.crops.get(filename)
+        if crop and canvas.find_withtag(crop[0]): crop_id = crop[0]; canvas.itemconfig(crop_id, image=photo); canvas.coords(crop_id, x, y)
+        else: crop_id = canvas.create_image(x, y, anchor="nw", image=photo, tags=("tile_crop",))
+        canvas.tag_raise(crop_id, data['id']) # Same stacking slot as the (hidden) tile
+        self.crops[filename] = (crop_id, box); self._set_hidden(filename, data, True)
+        self.culled.discard(filename); self.registry.put((filename, 'tile'), photo, scale)
+
+    @staticmethod
+    def scale_crop(image, box, scale):
+        size = (max(1, int(round((box[2] - box[0]) * scale))), max(1, int(round((box[3] - box[1]) * scale))))
+        return image.crop(box).resize(size, Image.NEAREST)
+
+    def _base_photo(self, filename, data):
+        """The tile's keyed 1x PhotoImage, kept while the tile stays in view."""
+        stamp = (data.get('revision', 0), self.view._key_params()); base = self.registry.get((filename, 'base'))
+        if base is None or base[1] != stamp:
+            base = (self.registry.put((filename, 'base'), to_photo(self.view.keyed_image(data, 'image', 1.0, cached=True), self.view.canvas), stamp, pinned=False), stamp)
+        return base[0]
+
+    def _native_scaled(self, filename, data, op, n, box=None):
+        """Integer zoom/subsample (of the whole tile or a crop box) done by Tk's photo copy from the
+        tile's 1x PhotoImage: no PIL resize or PIL-to-Tk transfer of the scaled pixels."""
+        photo = tk.PhotoImage(master=self.view.canvas)
+        region = ('-from', *box) if box else ()
+        photo.tk.call(photo.name, 'copy', str(self._base_photo(filename, data)), *region, f'-{op}', n, n)
+        return photo
+
+    # --- Crop Before Scale ---
+    def _crop_box(self, filename, data, scale):
+        """Integer (l, t, r, b) part of the tile (tile px) in view plus overscan, or None when the tile is
+        rendered whole: not zoomed in, fully in view, or selected (dragging needs the whole tile)."""
+        if scale <= 1.0 or filename in self.selected: return None
+        w, h = data['image'].size; l, t, r, b = self.visible_world_rect(CROP_OVERSCAN)
+        box = (max(0, int(l - data['x'])), max(0, int(t - data['y'])), min(w, int(np.ceil(r - data['x']))), min(h, int(np.ceil(b - data['y']))))
+        if box[0] >= box[2] or box[1] >= box[3] or box == (0, 0, w, h): return None
+        return box
+
+    def _crop_covers(self, filename, data):
+        """False when a cropped tile's crop no longer covers the part of the tile in the viewport."""
+        crop = self.crops.get(filename)
+        if crop is None: return True
+        w, h = data['image'].size; l, t, r, b = self.visible_world_rect(0)
+        vl, vt = max(0, l - data['x']), max(0, t - data['y']); vr, vb = min(w, r - data['x']), min(h, b - data['y'])
+        cl, ct, cr, cb = crop[1]
+        return vl >= cl and vt >= ct and vr <= cr and vb <= cb
+
+    def _drop_crop(self, filename):
+        crop = self.crops.pop(filename, None)
+        if crop and self.view.canvas.find_withtag(crop[0]): self.view.canvas.delete(crop[0])
+
+    def crop_owner(self, crop_id):
+        """Tile item id drawn by a 'tile_crop' item."""
+        for filename, (item_id, _) in self.crops.items():
+            if item_id == crop_id and filename in self.view.images: return self.view.images[filename]['id']
+        return None
+
+    # --- Progressive Rendering ---
+    def _render_async(self, todo, scale):
+        """Renders cheap tiles now (native integer zoom, cache hits) and hands the PIL resampling of the
+        rest to the worker. Tiles already in flight are skipped; a new scale or key supersedes everything
+        in flight (its results are dropped)."""
+        view = self.view; params = view._key_params(); jobs = []
+        if self.pending and self._pending_epoch != (scale, params): self._cancel_async()
+        for filename, data in todo:
+            if filename in self.pending and self.pending[filename] == data.get('revision', 0): continue # Already resampling
+            box = self._crop_box(filename, data, scale)
+            if native_factor(scale) or (not box and view.scaled_image_cache.peek(data, 'image', scale, params) is not None):
+                self.render(filename, data, scale); continue
+            # The keyed 1x image comes from the UI thread (mask cache); only resampling runs in the worker
+            jobs.append((filename, data.get('revision', 0), box, view.keyed_image(data, 'image', 1.0, cached=True)))
+            self.pending[filename] = data.get('revision', 0)
+        if not jobs: return
+        self._pending_epoch = (scale, params); self._jobs.put((self.generation, scale, params, jobs))
+        if self._worker is None: self._worker = threading.Thread(target=self._work, daemon=True); self._worker.start()
+        if not self._poll_job: self._poll_job = view.after(ASYNC_POLL_MS, self._poll_results)
+
+    def _cancel_async(self):
+        """Drops everything resampling in the background; its results are ignored when they arrive."""
+        self.generation += 1; self.pending.clear()
+        if self._poll_job: self.view.after_cancel(self._poll_job); self._poll_job = None
+
+    def _work(self):
+        while True:
+            generation, scale, params, jobs = self._jobs.get()
+            for filename, revision, box, image in jobs:
+                if generation != self.generation: break # Superseded by another zoom level or key
+                try: result = self.scale_crop(image, box, scale) if box else self.view.scale_for_view(image, scale)
+                except Exception as e: logging.error(f"Background render failed for {filename}: {e}", exc_info=True); result = None
+                self._results.put((generation, filename, revision, params, scale, box, result))
+
+    def _poll_results(self):
+        """Swaps finished background renders in (Tk thread); stale ones are dropped."""
+        self._poll_job = None; view = self.view; swapped = 0
+        while True:
+            try: generation, filename, revision, params, scale, box, image = self._results.get_nowait()
+            except queue.Empty: break
+            if generation != self.generation or self.pending.get(filename) != revision: continue
+            del self.pending[filename]; data = view.images.get(filename)
+            if image is None or not data or data.get('revision', 0) != revision or (self.layer and filename not in self.promoted): continue
+            if not box: image = view.scaled_image_cache.get(data, 'image', scale, params, lambda: image)
+            try: self._place(filename, data, scale, to_photo(image, view.canvas), box); swapped += 1
+            except Exception as e: logging.error(f"Swap-in error for {filename}: {e}", exc_info=True)
+        if swapped: logging.debug(f"Progressive render: {swapped} tile(s) swapped in, {len(self.pending)} pending.")
+        if self.pending: self._poll_job = view.after(ASYNC_POLL_MS, self._poll_results)
+
+    def create_item(self, filename, data):
+        """New canvas item for a tile at its world position, culled until update() or show() renders it."""
+        x, y = self.view.world_to_canvas(data['x'], data['y'])
+        data['id'] = self.view.canvas.create_image(x, y, anchor="nw", tags=("draggable", filename))
+        self.culled.add(filename); return data['id']
+
+    def release(self, filename, data):
+        self._drop_crop(filename); self._set_hidden(filename, data, False)
+        self.view.canvas.itemconfig(data['id'], image=''); self.culled.add(filename)
+        self.registry.release_owner(filename)
+
+    def show(self, filename):
+        """Renders one (new or changed) tile if it is in view; otherwise it is culled."""
+        data = self.view.images.get(filename)
+        if not data: return
+        if self.layer and filename not in self.promoted:
+            self._set_hidden(filename, data, True); self.layer.invalidate_tile(filename, data)
+        elif self.intersects(data, self.visible_world_rect()): self.render(filename, data)
+        else: self.release(filename, data)
+
+    def invalidate(self, filename=None):
+        """Marks one tile (or all) as out of date; visible ones are re-rendered on the next update."""
+        if filename is None:
+            for key in self.registry.keys('tile'): self.registry.set_meta(key, None)
+            self.registry.clear('base')
+        else: self.registry.set_meta((filename, 'tile'), None)
+        if filename is None:
+            if self.raster: self.raster.reset()
+            self.lod.reset()
+        elif self.layer and filename in self.view.images: self.layer.invalidate_tile(filename, self.view.images[filename])
+
+    def detach(self, filename):
+        """Drops a tile's rendered state, e.g. before its canvas item is recreated."""
+        self._drop_crop(filename); self.registry.release_owner(filename)
+        self.hidden.discard(filename); self.culled.discard(filename); self.promoted.discard(filename)
+
+    def moved(self, filename, old_bbox=None):
+        """A tile's item was moved outside a drag (undo/redo): its crop is re-cut on the next update and the
+        composited layer redraws the area it now covers and old_bbox (canvas rect it covered before)."""
+        data = self.view.images[filename]
+        if filename in self.crops: self.registry.set_meta((filename, 'tile'), None)
+        if self.layer and filename not in self.promoted: self.layer.invalidate_tile(filename, data, old_bbox=old_bbox)
+
+    def restacked(self, filename):
+        """A tile's item changed stacking slot: its crop item follows, the composited layer redraws its area."""
+        data = self.view.images[filename]; crop = self.crops.get(filename)
+        if crop: self.view.canvas.tag_raise(crop[0], data['id'])
+        if self.layer and filename not in self.promoted: self.layer.invalidate_tile(filename, data)
+
+    def top_item(self, filename):
+        """Topmost item drawing a tile: its crop item when cropped, else the tile item."""
+        crop = self.crops.get(filename)
+        return crop[0] if crop else self.view.images[filename]['id']
+
+    def forget(self, filename):
+        """Drops a tile that is being removed (call while it is still in view.images)."""
+        self.detach(filename)
+        if self.layer and filename in self.view.images: self.layer.invalidate_tile(filename, self.view.images[filename], exclude=True)
+
+    def clear(self):
+        """After the canvas items were deleted (redraw, layout load)."""
+        if self._update_job: self.view.after_cancel(self._update_job); self._update_job = None
+        self._cancel_async()
+        for filename in list(self.crops): self._drop_crop(filename)
+        self.registry.clear('tile'); self.registry.clear('base'); self.hidden.clear(); self.culled.clear(); self.promoted.clear()
+        if self.layer: self.layer.hide()
+
+    # --- Raster Mode ---
+    def set_raster_mode(self, enabled):
+        """Switches between one item per tile and a single composited viewport image. Call update() after,
+        which also shows the tiles again (when not zoomed out into the chunk view)."""
+        if enabled and not self.raster: self.raster = RasterLayer(self)
+        elif not enabled and self.raster:
+            self.raster.hide(); self.raster = None
+
+    def sync_promoted(self):
+        """Promotes newly selected tiles to their own items and returns deselected ones to the composited layer.
+        Newly selected cropped tiles are rendered whole."""
+        selected = self.selected = self._selected_names(); images = self.view.images
+        for filename in selected & self.crops.keys(): self.render(filename, images[filename])
+        if not self.layer: return
+        for filename in selected - self.promoted:
+            data = images[filename]; self.promoted.add(filename)
+            self._set_hidden(filename, data, False); self.render(filename, data)
+            self.layer.invalidate_tile(filename, data)
+        for filename in self.promoted - selected:
+            self.promoted.discard(filename)
+            if filename not in images: continue
+            data = images[filename]; self._set_hidden(filename, data, True); self.registry.release_owner(filename)
+            self.layer.invalidate_tile(filename, data)
+
+    def _selected_names(self):
+        names = set()
+        for item_id in self.view.selected_item_ids:
+            tags = self.view.canvas.gettags(item_id)
+            if len(tags) > 1 and tags[1] in self.view.images and self.view.images[tags[1]]['id'] == item_id: names.add(tags[1])
+        return names
+
+    def _set_hidden(self, filename, data, hidden):
+        if hidden == (filename in self.hidden): return
+        self.view.canvas.itemconfig(data['id'], state='hidden' if hidden else 'normal')
+        if hidden: self.hidden.add(filename)
+        else: self.hidden.discard(filename)
+
+    def tile_bbox(self, data):
+        """Canvas bbox of a tile from its world position and size (works for hidden and culled items)."""
+        scale = self.view.current_scale_factor; w, h = data['image'].size
+        x0, y0 = self.view.world_to_canvas(data['x'], data['y'])
+        return (x0, y0, x0 + max(1, int(w * scale)), y0 + max(1, int(h * scale)))
+
+    def bbox(self, item_id):
+        """canvas.bbox(item_id), falling back to the stored tile extent for tiles hidden in the composited layer
+        or culled (neither has a canvas bbox)."""
+        bbox = self.view.canvas.bbox(item_id)
+        if bbox or not (self.hidden or self.culled): return bbox
+        tags = self.view.canvas.gettags(item_id)
+        if len(tags) > 1 and (tags[1] in self.hidden or tags[1] in self.culled) and tags[1] in self.view.images:
+            return self.tile_bbox(self.view.images[tags[1]])
+        return bbox
+
+    def hidden_tiles_in(self, x0, y0, x1, y1, enclosed=False):
+        """Item ids of hidden (composited) and culled tiles overlapping (or enclosed by) a canvas rect;
+        canvas find_* skips them."""
+        found = []
+        for filename in self.hidden | self.culled:
+            data = self.view.images.get(filename)
+            if not data: continue
+            l, t, r, b = self.tile_bbox(data)
+            if (enclosed and l >= x0 and t >= y0 and r <= x1 and b <= y1) or (not enclosed and l < x1 and r > x0 and t < y1 and b > y0):
+                found.append(data['id'])
+        return found
+
+    def tile_at(self, canvas_x, canvas_y):
+        """Topmost hidden (composited) or culled tile item under a canvas point, or None."""
+        hits = set(self.hidden_tiles_in(canvas_x - 1, canvas_y - 1, canvas_x + 1, canvas_y + 1))
+        if not hits: return None
+        return max((d.get('z_index', 0), d['id']) for d in self.view.images.values() if d['id'] in hits)[1] # Stacking follows z-order
+
+    def restack(self):
+        if self.layer: restack_composite(self.view)
+
+def stacking_moves(current, desired):
+    """Items of desired (bottom to top) to restack so the items of current (bottom to top) end up in that order:
+    all but a longest run already in the right relative order (longest increasing subsequence), plus new ones."""
+    rank = {item: i for i, item in enumerate(desired)}; seq = [rank[item] for item in current if item in rank]
+    tails = []; tail_ranks = []; prev = [-1] * len(seq) # tails[k]: seq index ending the best run of length k + 1
+    for i, r in enumerate(seq):
+        k = bisect_left(tail_ranks, r)
+        if k: prev[i] = tails[k - 1]
+        if k == len(tails): tails.append(i); tail_ranks.append(r)
+        else: tails[k] = i; tail_ranks[k] = r
+    keep = set(); i = tails[-1] if tails else -1
+    while i >= 0: keep.add(seq[i]); i = prev[i]
+    return [item for i, item in enumerate(desired) if i not in keep]
+
+def restack_composite(view):
+    """Composited layer items sit where the tiles are: above grid and border, above the overlay when it is behind."""
+    canvas = view.canvas; overlay_id = view.pasted_overlay_item_id
+    if not canvas.find_withtag("composite"): return
+    behind = view.layer_behind or (hasattr(view.app, 'layer_behind_mode') and view.app.layer_behind_mode.get())
+    if behind and overlay_id and canvas.find_withtag(overlay_id): canvas.tag_raise("composite", overlay_id)
+    elif canvas.find_withtag("draggable"): canvas.tag_lower("composite", "draggable")
+    for tag in ("grid_line", "canvas_border"):
+        if canvas.find_withtag(tag): canvas.tag_lower(tag, "composite")
+
+def alpha_over(dst, src):
+    """Composites src over dst in place; both (h, w, 4) uint8."""
+    alpha = src[..., 3:4]
+    if not alpha.any(): return
+    if (alpha == 255).all(): dst[:] = src; return
+    a = alpha.astype(np.float32) / 255.0; inv = 1.0 - a
+    dst[..., :3] = (src[..., :3] * a + dst[..., :3] * inv + 0.5).astype(np.uint8)
+    dst[..., 3:4] = ((a + dst[..., 3:4] / 255.0 * inv) * 255.0 + 0.5).astype(np.uint8)
+
+class RasterLayer:
+    """The raster-drawn tiles of the viewport (plus margin) composited with NumPy into one buffer,
+    shown as a single canvas image item. Panning inside the buffer costs nothing; leaving it keeps
+    the overlapping part and composites only the newly exposed strips."""
+    def __init__(self, renderer):
+        self.renderer = renderer; self.view = renderer.view
+        self.item_id = None; self.photo = None; self.buffer = None
+        self.origin = (0, 0); self.scale = None # Canvas px of buffer[0, 0], scale it was built at
+
+    def reset(self):
+        """Forces a full re-composite (key, palette or z-order changed)."""
+        self.buffer = None
+
+    def hide(self):
+        """Removes the raster item (mode switched off, zoomed into LOD, or the canvas is being cleared)."""
+        if self.item_id and self.view.canvas.find_withtag(self.item_id): self.view.canvas.delete(self.item_id)
+        self.renderer.registry.release(('raster', 'buffer')); self.item_id = None; self.photo = None; self.reset()
+
+    def _viewport(self):
+        canvas = self.view.canvas
+        return int(canvas.canvasx(0)), int(canvas.canvasy(0)), max(1, canvas.winfo_width()), max(1, canvas.winfo_height())
+
+    def update(self, force=False):
+        scale = self.view.current_scale_factor; vx, vy, vw, vh = self._viewport()
+        if not force and self.buffer is not None and self.scale == scale:
+            ox, oy = self.origin; bh, bw = self.buffer.shape[:2]
+            if vx >= ox and vy >= oy and vx + vw <= ox + bw and vy + vh <= oy + bh: return # Still covered
+        m = VISIBILITY_MARGIN; origin = (vx - m, vy - m); w, h = vw + 2 * m, vh + 2 * m
+        buffer = np.zeros((h, w, 4), dtype=np.uint8); dirty = [(origin[0], origin[1], origin[0] + w, origin[1] + h)]
+        if self.buffer is not None and self.scale == scale and not force:
+            # Keep the overlap with the old buffer, composite only the uncovered strips
+            ox, oy = self.origin; bh, bw = self.buffer.shape[:2]
+            ix0, iy0 = max(ox, origin[0]), max(oy, origin[1]); ix1, iy1 = min(ox + bw, origin[0] + w), min(oy + bh, origin[1] + h)
+            if ix0 < ix1 and iy0 < iy1:
+                buffer[iy0-origin[1]:iy1-origin[1], ix0-origin[0]:ix1-origin[0]] = self.buffer[iy0-oy:iy1-oy, ix0-ox:ix1-ox]
+                x0, y0, x1, y1 = dirty[0]
+                dirty = [r for r in ((x0, y0, x1, iy0), (x0, iy1, x1, y1), (x0, iy0, ix0, iy1), (ix1, iy0, x1, iy1)) if r[0] < r[2] and r[1] < r[3]]
+        self.buffer = buffer; self.origin = origin; self.scale = scale
+        for rect in dirty: self._composite(rect)
+        self._show()
+        logging.debug(f"Raster: composited {len(dirty)} region(s), buffer {w}x{h} at {origin}.")
+
+    def invalidate_tile(self, filename, data, exclude=False, old_bbox=None):
+        """Re-composites the area of one tile (it moved, changed, was promoted or demoted), plus old_bbox
+        (the canvas rect it covered before a move)."""
+        if self.buffer is None: return
+        skip = filename if exclude else None
+        regions = [r for r in (self._composite(rect, skip) for rect in (self.renderer.tile_bbox(data), old_bbox) if rect) if r]
+        if regions: self._show((min(r[0] for r in regions), min(r[1] for r in regions), max(r[2] for r in regions), max(r[3] for r in regions)))
+
+    def _composite(self, rect, skip=None):
+        """Clears a canvas rect of the buffer and draws every raster tile overlapping it, bottom to top.
+        Returns the rect in buffer px (None when it is outside the buffer)."""
+        ox, oy = self.origin; bh, bw = self.buffer.shape[:2]
+        x0, y0 = max(int(rect[0]), ox), max(int(rect[1]), oy); x1, y1 = min(int(np.ceil(rect[2])), ox + bw), min(int(np.ceil(rect[3])), oy + bh)
+        if x0 >= x1 or y0 >= y1: return None
+        self.buffer[y0-oy:y1-oy, x0-ox:x1-ox] = 0
+        renderer = self.renderer
+        tiles = [(data.get('z_index', 0), data['id'], filename, data) for filename, data in self.view.images.items() if filename not in renderer.promoted and filename != skip]
+        for _, _, filename, data in sorted(tiles, key=lambda t: t[:2]):
+            tx0, ty0, tx1, ty1 = renderer.tile_bbox(data); tx0, ty0 = int(round(tx0)), int(round(ty0))
+            if tx0 >= x1 or ty0 >= y1 or tx0 + (tx1 - tx0) <= x0 or ty0 + (ty1 - ty0) <= y0: continue
+            pixels = self._tile_pixels(filename, data)
+            th, tw = pixels.shape[:2]
+            cx0, cy0 = max(x0, tx0), max(y0, ty0); cx1, cy1 = min(x1, tx0 + tw), min(y1, ty0 + th)
+            if cx0 >= cx1 or cy0 >= cy1: continue
+            alpha_over(self.buffer[cy0-oy:cy1-oy, cx0-ox:cx1-ox], pixels[cy0-ty0:cy1-ty0, cx0-tx0:cx1-tx0])
+        return (x0 - ox, y0 - oy, x1 - ox, y1 - oy)
+
+    def _tile_pixels(self, filename, data):
+        return np.asarray(self.view.keyed_image(data, 'image', self.scale, cached=True), dtype=np.uint8)
+
+    def _show(self, region=None):
+        """Puts the buffer on the canvas. Same-size buffers update the photo in place; region
+        (buffer px l, t, r, b) limits the update to the part that was re-composited."""
+        canvas = self.view.canvas; h, w = self.buffer.shape[:2]
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == (w, h):
+            l, t, r, b = region or (0, 0, w, h)
+            self.photo = update_photo(self.photo, self.buffer[t:b, l:r], to=(l, t))
+        else: self.photo = update_photo(tk.PhotoImage(master=canvas, width=w, height=h), self.buffer) # tk photo, so regions update in place
+        if self.item_id and canvas.find_withtag(self.item_id):
+            canvas.itemconfig(self.item_id, image=self.photo); canvas.coords(self.item_id, *self.origin)
+        else:
+            self.item_id = canvas.create_image(*self.origin, anchor="nw", image=self.photo, tags=("raster", "composite"))
+            restack_composite(self.view)
+        self.renderer.registry.put(('raster', 'buffer'), self.photo)
+
+class ChunkLOD:
+    """Zoomed-out view: the world is split into LOD_CHUNK_SIZE chunks, each drawn as one image item.
+    A chunk's composite is built once at full size, then kept only as power-of-two box downscales
+    (LRU under LOD_CACHE_BYTES), so zooming around below LOD_MAX_SCALE reuses them. Each composite
+    remembers a signature of its tiles (position, z-order, revision, key settings); a chunk is only
+    rebuilt when a tile inside it moved or changed."""
+    def __init__(self, renderer):
+        self.renderer = renderer; self.view = renderer.view
+        self.levels = OrderedDict(); self.cache_bytes = 0 # (cx, cy) -> (signature, {level: RGBA image})
+        self.items = {} # (cx, cy) -> (item_id, scale, signature) for chunks on the canvas; photos under ((cx, cy), 'chunk')
+        self._skip = None
+
+    def reset(self):
+        self.levels.clear(); self.cache_bytes = 0
+
+    def hide(self):
+        for item_id, *_ in self.items.values():
+            if self.view.canvas.find_withtag(item_id): self.view.canvas.delete(item_id)
+        self.items.clear(); self.renderer.registry.clear('chunk')
+
+    def invalidate_tile(self, filename, data, exclude=False, old_bbox=None):
+        """Redraws the chunks on screen; only those whose tiles changed are rebuilt (the chunk signatures
+        also catch the area a moved tile left, so old_bbox isn't needed)."""
+        if not self.items: return # Not shown yet, the next update() builds everything
+        self._skip = filename if exclude else None
+        try: self.update()
+        finally: self._skip = None
+
+    def _index(self):
+        """(cx, cy) -> [(z, item id, filename, data)] of the tiles drawn by the chunks."""
+        index = {}; c = LOD_CHUNK_SIZE; promoted = self.renderer.promoted
+        for filename, data in self.view.images.items():
+            if filename in promoted or filename == self._skip: continue
+            w, h = data['image'].size; entry = (data.get('z_index', 0), data['id'], filename, data)
+            for cy in range(int(data['y'] // c), int((data['y'] + h - 1) // c) + 1):
+                for cx in range(int(data['x'] // c), int((data['x'] + w - 1) // c) + 1):
+                    index.setdefault((cx, cy), []).append(entry)
+        return index
+
+    def update(self, force=False):
+        view = self.view; canvas = view.canvas; scale = view.current_scale_factor; c = LOD_CHUNK_SIZE
+        level = max(1, int(np.floor(np.log2(1.0 / scale) + 1e-9))) # Coarsest level still >= display size
+        key_params = view._key_params()
+        l, t, r, b = self.renderer.visible_world_rect(); index = self._index(); visible = set(); built = 0
+        for cy in range(int(t // c), int(b // c) + 1):
+            for cx in range(int(l // c), int(r // c) + 1):
+                tiles = index.get((cx, cy))
+                if not tiles: continue
+                tiles.sort(key=lambda e: (e[0], e[1])); visible.add((cx, cy))
+                signature = (key_params, tuple((f, d['x'], d['y'], d.get('revision', 0), id(d['image'])) for _, _, f, d in tiles))
+                shown = self.items.get((cx, cy))
+                if shown and not force and shown[1] == scale and shown[2] == signature: continue
+                image = self._level_image((cx, cy), tiles, signature, level); built += 1
+                x0, y0 = int(round(cx * c * scale)), int(round(cy * c * scale))
+                size = (max(1, int(round((cx + 1) * c * scale)) - x0), max(1, int(round((cy + 1) * c * scale)) - y0))
+                photo = to_photo(image.resize(size, Image.NEAREST), canvas)
+                if shown and canvas.find_withtag(shown[0]):
+                    item_id = shown[0]; canvas.itemconfig(item_id, image=photo); canvas.coords(item_id, x0, y0)
+                else: item_id = canvas.create_image(x0, y0, anchor="nw", image=photo, tags=("lod_chunk", "composite"))
+                self.items[(cx, cy)] = (item_id, scale, signature); self.renderer.registry.put(((cx, cy), 'chunk'), photo)
+        for chunk in [k for k in self.items if k not in visible]:
+            item_id = self.items.pop(chunk)[0]
+            if canvas.find_withtag(item_id): canvas.delete(item_id)
+            self.renderer.registry.release((chunk, 'chunk'))
+        if built: restack_composite(view); logging.debug(f"LOD: {built} chunk(s) drawn at level {level}, {len(self.items)} on screen, {self.cache_bytes} bytes cached.")
+
+    def _level_image(self, chunk, tiles, signature, level):
+        """Chunk composite at 1 / 2**level, from the cache when its signature still matches."""
+        cached = self.levels.get(chunk)
+        if cached and cached[0] == signature:
+            self.levels.move_to_end(chunk); images = cached[1]
+            if level in images: return images[level]
+            finer = max((l for l in images if l < level), default=None)
+            if finer is not None: return self._store(chunk, signature, images[finer], finer, level)
+        if cached: self.cache_bytes -= sum(i.width * i.height * 4 for i in cached[1].values()); del self.levels[chunk]
+        return self._store(chunk, signature, self._composite(chunk, tiles), 0, level)
+
+    def _store(self, chunk, signature, image, from_level, level):
+        _, images = self.levels.setdefault(chunk, (signature, {}))
+        for l in range(from_level + 1, level + 1):
+            image = image.reduce(2); images[l] = image; self.cache_bytes += image.width * image.height * 4
+        self.levels.move_to_end(chunk)
+        while self.cache_bytes > LOD_CACHE_BYTES and len(self.levels) > 1:
+            _, (_, old) = self.levels.popitem(last=False); self.cache_bytes -= sum(i.width * i.height * 4 for i in old.values())
+        return image
+
+    def _composite(self, chunk, tiles):
+        """Full-size RGBA composite of one chunk's tiles, bottom to top (only kept long enough to downscale)."""
+        c = LOD_CHUNK_SIZE; ox, oy = chunk[0] * c, chunk[1] * c
+        buffer = np.zeros((c, c, 4), dtype=np.uint8)
+        for _, _, _, data in tiles:
+            pixels = np.asarray(self.view.keyed_image(data, 'image', 1.0), dtype=np.uint8)
+            tx, ty = int(round(data['x'])) - ox, int(round(data['y'])) - oy; th, tw = pixels.shape[:2]
+            x0, y0 = max(tx, 0), max(ty, 0); x1, y1 = min(tx + tw, c), min(ty + th, c)
+            if x0 < x1 and y0 < y1: alpha_over(buffer[y0:y1, x0:x1], pixels[y0-ty:y1-ty, x0-tx:x1-tx])
+        return Image.fromarray(buffer, 'RGBA')
@@ -0,0 +1,78 @@
+# --- canvas/scalecache.py ---
+import logging
+import math
+from collections import OrderedDict
+
+ZOOM_STEP = 1.15 # One mouse wheel notch
+SCALE_CACHE_BUDGET_BYTES = 128 * 1024 * 1024
+
+def quantize_scale(scale, step=ZOOM_STEP):
+    """Snaps a zoom factor to the nearest power of step, so wheeling back to a level hits the same
+    cache key instead of a float that drifted by 1e-15 (1.0 stays exactly 1.0)."""
+    return step ** round(math.log(scale) / math.log(step))
+
+def native_factor(scale):
+    """('zoom', n) or ('subsample', n) when scale is an integer factor n >= 2 (or 1/n) that Tk's
+    PhotoImage copy can produce from the 1x image in C; None otherwise (PIL resize path)."""
+    for op, factor in (('zoom', scale), ('subsample', 1.0 / scale)):
+        n = round(factor)
+        if n >= 2 and abs(factor - n) < 1e-6: return op, n
+    return None
+
+def pixel_zoom_step(scale, zoom_in, min_scale=0.1, max_scale=8.0):
+    """Next integer zoom level ('pixel zoom'): ... 1/3, 1/2, 1, 2, 3 ... A non-integer scale snaps
+    to the neighbouring level in the wheel direction. None when past the limits."""
+    if scale >= 1.0: n = math.floor(scale + 1e-6) + 1 if zoom_in else math.ceil(scale - 1e-6) - 1; new = float(n) if n >= 1 else 0.5
+    else: d = math.ceil(1.0 / scale - 1e-6) - 1 if zoom_in else math.floor(1.0 / scale + 1e-6) + 1; new = 1.0 / d
+    return new if min_scale - 1e-9 <= new <= max_scale + 1e-9 else None
+
+class ScaledImageCache:
+    """Per-tile cache of keyed, resized display images, LRU-evicted under a byte budget.
+    Images are attached to the tile record (record['scaled_images']) and keyed by
+    (source, scale, key params, revision), where key params is view._key_params().
+    Like KeyMaskCache it relies on the record's revision being bumped when its images change."""
+    def __init__(self, budget_bytes=SCALE_CACHE_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes; self.used_bytes = 0
+        self._lru = OrderedDict()  # (id(record), key) -> record, oldest first
+        self.hits = 0; self.misses = 0
+
+    def get(self, record, source, scale, key_params, compute):
+        """record's cached image for these settings, or compute() stored under them."""
+        key = (source, round(scale, 6), key_params, record.get('revision', 0))
+        images = record.setdefault('scaled_images', {})
+        image = images.get(key)
+        if image is not None:
+            self.hits += 1; self._lru.move_to_end((id(record), key))
+            return image
+        self.misses += 1
+        for stale in [k for k in images if k[3] != key[3]]: self._remove(record, stale) # Older revisions can't be hit again
+        image = compute()
+        images[key] = image; self._lru[(id(record), key)] = record
+        self.used_bytes += self._nbytes(image)
+        self._evict()
+        return image
+
+    def peek(self, record, source, scale, key_params):
+        """The cached image for these settings, or None (no compute, no LRU update)."""
+        return record.get('scaled_images', {}).get((source, round(scale, 6), key_params, record.get('revision', 0)))
+
+    @staticmethod
+    def _nbytes(image): return image.width * image.height * len(image.getbands())
+
+    def discard(self, record):
+        """Forgets all images of a record (e.g. when the tile is removed)."""
+        for key in list(record.get('scaled_images', {})): self._remove(record, key)
+
+    def clear(self):
+        for (_, key), record in list(self._lru.items()): self._remove(record, key)
+
+    def _remove(self, record, key):
+        image = record.get('scaled_images', {}).pop(key, None)
+        if image is not None: self.used_bytes -= self._nbytes(image)
+        self._lru.pop((id(record), key), None)
+
+    def _evict(self):
+        while self.used_bytes > self.budget_bytes and len(self._lru) > 1:
+            (_, key), record = next(iter(self._lru.items()))
+            self._remove(record, key)
+            logging.debug(f"Scaled image cache evicted {key[:2]}, {self.used_bytes} bytes in use.")
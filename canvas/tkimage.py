@@ -0,0 +1,131 @@
+# --- canvas/tkimage.py ---
+import logging
+from collections import OrderedDict
+import tkinter as tk
+import numpy as np
+from PIL import Image, ImageTk
+
+# Image -> Tk conversion: 3-channel (RGB) pixels go to Tk as one binary PPM payload, a single
+# tobytes() of the buffer (~1.2-1.5 ms for 1024x1024, before Tk decodes it). Tk has no PPM with
+# alpha, so RGBA pixels (every keyed tile) keep using ImageTk's blit: stripping alpha alone costs
+# ~3-9 ms for 1024x1024 and would lose the transparency. Existing photos are updated in place.
+# bench_tkimage.py times both paths for RGB and RGBA tiles; the Tk-side numbers need a display.
+
+def to_pil(image):
+    """PIL RGB/RGBA image of a PIL image or uint8 array, for ImageTk."""
+    if isinstance(image, np.ndarray): return Image.fromarray(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        from .palette import to_rgba
+        return to_rgba(image)
+    return image
+
+def ppm_payload(image):
+    """Binary PPM (P6) of an RGB image or (h, w, 3) array, or None when it has an alpha channel."""
+    if isinstance(image, np.ndarray):
+        if image.shape[2] != 3: return None
+        h, w = image.shape[:2]; data = np.ascontiguousarray(image).tobytes()
+    elif image.mode == 'RGB': (w, h), data = image.size, image.tobytes()
+    else: return None
+    return b'P6 %d %d 255\n' % (w, h) + data
+
+def to_photo(image, master=None):
+    """New photo of a PIL image or uint8 array: a tk.PhotoImage from a PPM payload for RGB pixels,
+    else (or if Tk rejects the payload) an ImageTk.PhotoImage."""
+    data = ppm_payload(image)
+    if data is not None:
+        try: return tk.PhotoImage(master=master, data=data, format='ppm')
+        except tk.TclError as e: logging.debug(f"Tk rejected a PPM payload ({e}), using ImageTk.")
+    return ImageTk.PhotoImage(to_pil(image), master=master)
+
+def update_photo(photo, image, to=(0, 0)):
+    """Writes image into an existing photo at to (x, y), in place; pixels outside the region are kept.
+    Returns photo, or a new one when it can't be updated in place (an ImageTk photo and a partial region)."""
+    if isinstance(photo, tk.PhotoImage):
+        data = ppm_payload(image)
+        if data is not None:
+            try: photo.tk.call(photo.name, 'put', data, '-format', 'ppm', '-to', *to); return photo
+            except tk.TclError as e: logging.debug(f"Tk rejected a PPM payload ({e}), using ImageTk.")
+        # Alpha: blit with ImageTk, then a 'set' copy so the region replaces (not composites over) what is there
+        region = ImageTk.PhotoImage(to_pil(image), master=photo)
+        photo.tk.call(photo.name, 'copy', str(region), '-to', *to, '-compositingrule', 'set')
+        return photo
+    image = to_pil(image)
+    if to == (0, 0) and (photo.width(), photo.height()) == image.size: photo.paste(image); return photo
+    return to_photo(image)
+
+PHOTO_CACHE_MAX_COUNT = 1024 # Unpinned (cached, not on screen) photos kept at most
+PHOTO_CACHE_BUDGET_BYTES = 256 * 1024 * 1024 # ... and their pixel bytes at most
+
+def photo_bytes(photo):
+    return photo.width() * photo.height() * 4 # Tk keeps photos as 32-bit RGBA
+
+def release_photo(photo):
+    """Deletes the Tk image now instead of whenever Python collects the object (ImageTk photos
+    delete theirs when collected)."""
+    if not isinstance(photo, tk.PhotoImage): return
+    try: photo.tk.call('image', 'delete', str(photo))
+    except tk.TclError: pass
+
+class PhotoRegistry:
+    """Every live Tk photo of the canvas, one entry per (owner, variant) key, e.g. (filename, 'tile').
+    Putting a photo under a key releases the one it supersedes at once. Pinned entries are on screen
+    and stay until replaced or released; unpinned ones (cached variants) are LRU-evicted beyond
+    PHOTO_CACHE_MAX_COUNT entries or PHOTO_CACHE_BUDGET_BYTES. Each entry carries a meta value
+    (e.g. the scale it was rendered at)."""
+    def __init__(self, max_cached=PHOTO_CACHE_MAX_COUNT, budget_bytes=PHOTO_CACHE_BUDGET_BYTES):
+        self.max_cached = max_cached; self.budget_bytes = budget_bytes
+        self._entries = {} # key -> [photo, meta, pinned, bytes]
+        self._lru = OrderedDict() # Unpinned keys, oldest first
+        self._owners = {} # owner -> its keys, so release_owner doesn't scan the registry
+        self.live_bytes = 0; self.cached_bytes = 0
+
+    def put(self, key, photo, meta=None, pinned=True):
+        """Registers photo under key (call after it has replaced the old one on screen); returns photo."""
+        old = self._entries.get(key)
+        if old is not None and old[0] is photo: self._forget(key); old = None # Same photo updated in place
+        if old is not None: self.release(key)
+        size = photo_bytes(photo); self._entries[key] = [photo, meta, pinned, size]; self.live_bytes += size
+        self._owners.setdefault(key[0], set()).add(key)
+        if not pinned: self._lru[key] = None; self.cached_bytes += size; self._evict()
+        return photo
+
+    def get(self, key):
+        """(photo, meta) or None."""
+        entry = self._entries.get(key)
+        if entry is None: return None
+        if key in self._lru: self._lru.move_to_end(key)
+        return entry[0], entry[1]
+
+    def set_meta(self, key, meta):
+        if key in self._entries: self._entries[key][1] = meta
+
+    def keys(self, variant=None):
+        return [key for key in self._entries if variant is None or key[1] == variant]
+
+    def release(self, key):
+        entry = self._forget(key)
+        if entry is not None: release_photo(entry[0])
+
+    def release_owner(self, owner):
+        for key in list(self._owners.get(owner, ())): self.release(key)
+
+    def clear(self, variant=None):
+        for key in self.keys(variant): self.release(key)
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None: return None
+        self.live_bytes -= entry[3]; keys = self._owners[key[0]]; keys.discard(key)
+        if not keys: del self._owners[key[0]]
+        if key in self._lru: del self._lru[key]; self.cached_bytes -= entry[3]
+        return entry
+
+    def _evict(self):
+        while self._lru and (len(self._lru) > self.max_cached or self.cached_bytes > self.budget_bytes):
+            key = next(iter(self._lru)); self.release(key)
+
+    def __len__(self): return len(self._entries)
+
+    def report(self):
+        """Live photo count and bytes, e.g. for the debug log."""
+        return f"{len(self._entries)} live photos ({len(self._lru)} cached), {self.live_bytes / 1048576:.1f} MB"
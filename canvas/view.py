@@ -6,7 +6,7 @@ import math
 import os
 import base64
 import io
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageDraw
 
 from .handlers.background import BackgroundHandler
 from .handlers.interaction import InteractionHandler
@@ -14,8 +14,15 @@ from .handlers.overlay import OverlayHandler
 from .handlers.tile import TileHandler
 from .handlers.alignment import AlignmentHandler
 from .apply import run_apply_canvas_to_images
+from .keying import KeyMaskCache, apply_mask, parse_key
+from .palette import remap_to_palette, to_rgba
+from .render import TileRenderer, stacking_moves
+from .scalecache import ScaledImageCache, ZOOM_STEP, pixel_zoom_step, quantize_scale
+from .tkimage import PhotoRegistry, to_photo
 from .utils import is_above_canvas
 
+KEY_PREVIEW_DEBOUNCE_MS = 40 # Slider motion settles this long before tiles are re-keyed
+
 try: LANCZOS_RESAMPLE = Image.Resampling.LANCZOS
 except AttributeError: LANCZOS_RESAMPLE = Image.LANCZOS; logging.warning("Using older Pillow Image.LANCZOS filter.")
 
@@ -41,11 +48,19 @@ class CanvasWindow(tk.Frame):
             checkbox_frame = tk.Frame(self); checkbox_frame.place(in_=self.canvas, relx=1.0, rely=1.0, x=-5, y=-5, anchor="se")
             self.snap_enabled = tk.BooleanVar(value=True); self.snap_checkbox = tk.Checkbutton(checkbox_frame, text="Snap", variable=self.snap_enabled, bg="#F0F0F0", relief="raised", bd=1, padx=2); self.snap_checkbox.pack(side="right", padx=(2,0))
             self.overlap_enabled = tk.BooleanVar(value=True); self.overlap_checkbox = tk.Checkbutton(checkbox_frame, text="Overlap", variable=self.overlap_enabled, bg="#F0F0F0", relief="raised", bd=1, padx=2); self.overlap_checkbox.pack(side="right", padx=(0,2))
+            self.raster_mode = tk.BooleanVar(value=False); self.raster_checkbox = tk.Checkbutton(checkbox_frame, text="Raster", variable=self.raster_mode, command=self.on_raster_toggle, bg="#F0F0F0", relief="raised", bd=1, padx=2); self.raster_checkbox.pack(side="right", padx=(0,2))
+            self.pixel_zoom = tk.BooleanVar(value=False); self.pixel_zoom_checkbox = tk.Checkbutton(checkbox_frame, text="Pixel", variable=self.pixel_zoom, bg="#F0F0F0", relief="raised", bd=1, padx=2); self.pixel_zoom_checkbox.pack(side="right", padx=(0,2))
             # Add Refresh button next to Overlay group
             refresh_btn = tk.Button(self, text="Refresh Images", command=self.refresh_images, bg="#F0F0F0", relief="raised", bd=1)
             refresh_btn.place(in_=self.canvas, relx=0.0, rely=0.0, x=5, y=5, anchor="nw")
             # State
-            self.images = {}; self.tk_images = []; self.background_color = None; self.transparency_color = None; self.pasted_overlay_pil_image = None; self.pasted_overlay_tk_image = None; self.pasted_overlay_item_id = None; self.pasted_overlay_offset = (0, 0); self.current_grid_info = None; self.last_clicked_item_id = None; self.selected_item_ids = set(); self.current_scale_factor = 1.0; self.zoom_label = None; self.zoom_label_after_id = None; self.last_capture_origin = None; self.layer_behind = False; self.next_z_index = 1; self.overlay_opacity = 1.0  # Add overlay opacity tracking
+            self.images = {}; self.photo_registry = PhotoRegistry(); self.background_color = None; self.transparency_color = None; self.pasted_overlay_pil_image = None; self.pasted_overlay_tk_image = None; self.pasted_overlay_item_id = None; self._overlay_source = None; self.pasted_overlay_offset = (0, 0); self.current_grid_info = None; self.last_clicked_item_id = None; self.selected_item_ids = set(); self.current_scale_factor = 1.0; self.zoom_label = None; self.zoom_label_after_id = None; self.last_capture_origin = None; self.layer_behind = False; self.next_z_index = 1; self.overlay_opacity = 1.0  # Add overlay opacity tracking
+            self.key_mask_cache = KeyMaskCache() # Per-tile key masks, reused by every render/capture path
+            self.scaled_image_cache = ScaledImageCache() # Keyed display images per tile and zoom level
+            self._key_preview_job = None
+            self.tile_renderer = TileRenderer(self) # Only tiles in view get PhotoImages
+            # Any scroll, pan, zoom or resize changes what is visible
+            self.canvas.config(xscrollcommand=self.tile_renderer.schedule_update, yscrollcommand=self.tile_renderer.schedule_update)
             self.layer_behind = False  # Add this line to track layer mode
             self.next_z_index = 1  # Track next available z-index
             # Handlers
@@ -107,32 +122,72 @@ class CanvasWindow(tk.Frame):
         self.set_transparency_color(color_hex)
 
     def paste_image_from_clipboard(self): self.overlay_handler.paste_from_clipboard()
-    def apply_canvas_to_images(self): run_apply_canvas_to_images(self) # Calls zoom check internally
+    def apply_canvas_to_images(self): run_apply_canvas_to_images(self) # Works at any zoom (world coords)
     def is_above_canvas(self, event): return is_above_canvas(self.canvas, event)
 
+    # --- World/Canvas Coordinates ---
+    # Items are drawn at world * current_scale_factor. images[...]['x'/'y'] and pasted_overlay_offset
+    # are always world (1.0x) coordinates, so capture and apply never depend on the view zoom.
+    def world_to_canvas(self, x, y): return x * self.current_scale_factor, y * self.current_scale_factor
+    def canvas_to_world(self, x, y): return x / self.current_scale_factor, y / self.current_scale_factor
+    def scale_for_view(self, pil_image, scale=None):
+        """Display copy of a 1.0x image at the current (or given) zoom (NEAREST for pixel-perfect zoom)."""
+        if scale is None: scale = self.current_scale_factor
+        if abs(scale - 1.0) < 0.001: return pil_image
+        return pil_image.resize((max(1, int(pil_image.width * scale)), max(1, int(pil_image.height * scale))), Image.NEAREST)
+    # --- Transparency Keying ---
+    def _key_params(self):
+        """(key, tolerance, invert) of the current transparency key, or None when no key color is set.
+        key is an (r, g, b) tuple, or a KeySet when several key colors are given."""
+        tolerance = self.app.tolerance_value.get() if hasattr(self.app, 'tolerance_value') else 0
+        color, tolerance = parse_key(self.transparency_color, tolerance)
+        if color is None: return None
+        invert = self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
+        return color, tolerance, invert
+    def keyed_image(self, data, source='original_image', scale=1.0, cached=False):
+        """data[source] with the transparency key applied (mask from key_mask_cache), resized to scale.
+        Falls back to data['image'] for tiles without an original. Always RGBA (indexed tiles via their palette).
+        cached=True (display paths) keeps the result in scaled_image_cache; don't modify it then."""
+        if source not in data: source = 'image'
+        params = self._key_params()
+        def compute():
+            image = data[source]
+            image = apply_mask(image, self.key_mask_cache.get(data, source, *params)) if params else to_rgba(image)
+            return self.scale_for_view(image, scale)
+        return self.scaled_image_cache.get(data, source, scale, params, compute) if cached else compute()
+    def preview_key_change(self):
+        """Live preview of a key change (e.g. tolerance slider): debounced, re-keys only the tiles in view.
+        Culled tiles have no PhotoImage and pick up the new key when they scroll in."""
+        if self._key_preview_job: self.after_cancel(self._key_preview_job)
+        self._key_preview_job = self.after(KEY_PREVIEW_DEBOUNCE_MS, self._run_key_preview)
+    def _run_key_preview(self):
+        self._key_preview_job = None
+        rendered, _ = self.tile_renderer.update(force=True)
+        logging.debug(f"Key preview: re-keyed {rendered} tile(s) in view.")
+    def _cancel_key_preview(self):
+        if self._key_preview_job: self.after_cancel(self._key_preview_job); self._key_preview_job = None
+
+    def _update_scrollregion(self):
+        self.canvas.config(scrollregion=(0, 0, self.canvas_world_width * self.current_scale_factor, self.canvas_world_height * self.current_scale_factor))
+
     # *** NEW: Method to set world size ***
     def set_world_size(self, width, height):
         """Updates the logical size of the canvas world and redraws."""
         logging.info(f"Setting canvas world size to {width}x{height}")
         self.canvas_world_width = max(1, width) # Ensure minimum size
         self.canvas_world_height = max(1, height)
-        # Update scrollregion - coords are always relative to 0,0 at 1.0x zoom
-        # Note: Tkinter canvas coords are floats, but scrollregion expects integers or floats.
-        # Let's provide floats based on the world size scaled by current zoom.
-        # Although, logically, scrollregion should represent the total area at 1.0x?
-        # Let's stick to 1.0x for scrollregion definition. Panning/Zooming is relative.
-        self.canvas.config(scrollregion=(0, 0, self.canvas_world_width, self.canvas_world_height))
-        logging.info(f"Canvas scrollregion set to (0, 0, {self.canvas_world_width}, {self.canvas_world_height})")
+        # Update scrollregion - the world area at the current zoom, anchored at canvas 0,0
+        self._update_scrollregion()
+        logging.info(f"Canvas scrollregion set for world (0, 0, {self.canvas_world_width}, {self.canvas_world_height}) at {self.current_scale_factor:.2f}x")
         self._draw_canvas_borders() # Redraw borders with new size
         self.draw_grid()           # Redraw grid with new bounds
 
     # --- Get/Save Canvas Image (MODIFIED - Use Capture Mode) ---
     def get_canvas_as_image(self, capture_mode="View") -> Image.Image | None:
-        """Captures canvas content by manual rendering. ASSUMES 1.0x ZOOM."""
-        logging.info(f"get_canvas_as_image called (mode={capture_mode}, zoom assumed 1.0x)")
+        """Captures canvas content by manual rendering from world coords, at 1.0x whatever the view zoom."""
+        logging.info(f"get_canvas_as_image called (mode={capture_mode}, view zoom {self.current_scale_factor:.2f}x)")
         try:
             self.canvas.update_idletasks()
-            if abs(self.current_scale_factor - 1.0) > 0.001: logging.error("get_canvas_as_image requires zoom=1.0x!"); return None
 
             render_origin_x, render_origin_y = 0, 0; target_width, target_height = 0, 0
             canvas_bbox_l, canvas_bbox_t = 0, 0; canvas_bbox_r, canvas_bbox_b = 0, 0
@@ -147,7 +202,8 @@ class CanvasWindow(tk.Frame):
                 self.last_capture_origin = (0, 0) # Origin is canvas 0,0
                 logging.info(f"Full Canvas render Size: {target_width}x{target_height}")
                 # Collect ALL draggable items within world bounds
-                all_draggable_ids = self.canvas.find_enclosed(0, 0, target_width, target_height)
+                full_rect = (0, 0, *self.world_to_canvas(target_width, target_height))
+                all_draggable_ids = sorted({*self.canvas.find_enclosed(*full_rect), *self.tile_renderer.hidden_tiles_in(*full_rect, enclosed=True)})
                 for item_id in all_draggable_ids:
                     if "draggable" not in self.canvas.gettags(item_id): continue
                     coords=None; pil_img=None; is_tile=False
@@ -156,15 +212,7 @@ class CanvasWindow(tk.Frame):
                         for fname, data in self.images.items():
                             if data['id'] == item_id: 
                                 coords=(data['x'], data['y'])
-                                pil_img=data.get('original_image', data['image']).copy()
-                                if self.transparency_color:
-                                    hex_color = self.transparency_color.lstrip('#')
-                                    color_tuple = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                                    pil_img = self.bg_handler.apply_transparency(
-                                        pil_img,
-                                        color_tuple,
-                                        invert=self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
-                                    )
+                                pil_img=self.keyed_image(data)
                                 is_tile=True
                                 break
                     if coords and pil_img: items_data_for_render.append((item_id, pil_img, coords, is_tile))
@@ -182,15 +230,7 @@ class CanvasWindow(tk.Frame):
                         for fname, data in self.images.items():
                             if data['id'] == item_id: 
                                 coords=(data['x'], data['y'])
-                                pil_img=data.get('original_image', data['image']).copy()
-                                if self.transparency_color:
-                                    hex_color = self.transparency_color.lstrip('#')
-                                    color_tuple = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                                    pil_img = self.bg_handler.apply_transparency(
-                                        pil_img,
-                                        color_tuple,
-                                        invert=self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
-                                    )
+                                pil_img=self.keyed_image(data)
                                 is_tile=True
                                 break
                     if coords and pil_img:
@@ -206,12 +246,14 @@ class CanvasWindow(tk.Frame):
 
             else: # Default to "View" capture
                 logging.debug("Calculating bounds for current view capture (@1.0x)...")
-                target_width = self.canvas.winfo_width(); target_height = self.canvas.winfo_height()
-                canvas_bbox_l = self.canvas.canvasx(0); canvas_bbox_t = self.canvas.canvasy(0) # At 1.0x these are the TL canvas coords
-                canvas_bbox_r = canvas_bbox_l + target_width; canvas_bbox_b = canvas_bbox_t + target_height
+                view_l = self.canvas.canvasx(0); view_t = self.canvas.canvasy(0)
+                view_r = view_l + self.canvas.winfo_width(); view_b = view_t + self.canvas.winfo_height()
+                # The visible area in world coords, rendered at 1.0x
+                canvas_bbox_l, canvas_bbox_t = self.canvas_to_world(view_l, view_t); canvas_bbox_r, canvas_bbox_b = self.canvas_to_world(view_r, view_b)
+                target_width = int(round(canvas_bbox_r - canvas_bbox_l)); target_height = int(round(canvas_bbox_b - canvas_bbox_t))
                 render_origin_x, render_origin_y = canvas_bbox_l, canvas_bbox_t
                 self.last_capture_origin = None # Not a specific origin capture
-                items_in_view = self.canvas.find_overlapping(canvas_bbox_l, canvas_bbox_t, canvas_bbox_r, canvas_bbox_b)
+                items_in_view = sorted({*self.canvas.find_overlapping(view_l, view_t, view_r, view_b), *self.tile_renderer.hidden_tiles_in(view_l, view_t, view_r, view_b)})
                 for item_id in items_in_view:
                     if "draggable" not in self.canvas.gettags(item_id): continue
                     coords=None; pil_img=None; is_tile=False
@@ -220,15 +262,7 @@ class CanvasWindow(tk.Frame):
                         for fname, data in self.images.items():
                             if data['id'] == item_id: 
                                 coords=(data['x'], data['y'])
-                                pil_img=data.get('original_image', data['image']).copy()
-                                if self.transparency_color:
-                                    hex_color = self.transparency_color.lstrip('#')
-                                    color_tuple = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                                    pil_img = self.bg_handler.apply_transparency(
-                                        pil_img,
-                                        color_tuple,
-                                        invert=self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
-                                    )
+                                pil_img=self.keyed_image(data)
                                 is_tile=True
                                 break
                     if coords and pil_img: items_data_for_render.append((item_id, pil_img, coords, is_tile))
@@ -239,7 +273,8 @@ class CanvasWindow(tk.Frame):
             target_image = Image.new("RGBA", (target_width, target_height), (255, 255, 255, 0))
 
             # --- Render Items (always at 1.0x scale) ---
-            ordered_render_items = sorted(items_data_for_render, key=lambda item: item[0])
+            stacking = {item_id: i for i, item_id in enumerate(self.canvas.find_all())} # Item ids don't follow z-order once restacked
+            ordered_render_items = sorted(items_data_for_render, key=lambda item: stacking.get(item[0], 0))
             logging.debug(f"Rendering {len(ordered_render_items)} items for mode '{capture_mode}'...")
             for item_id, pil_to_render, coords_1x, is_tile in ordered_render_items:
                 img_to_paste = pil_to_render.copy()
@@ -255,7 +290,6 @@ class CanvasWindow(tk.Frame):
 
     def save_canvas_image(self, file_path, capture_mode="View"):
         logging.info(f"Saving canvas image to {file_path} (Capture Mode: {capture_mode})")
-        if not abs(self.current_scale_factor - 1.0) < 0.001: messagebox.showwarning("Zoom Error", "Please reset zoom to 100% before saving."); logging.warning("Save cancelled: Zoom not 100%."); return
         img = self.get_canvas_as_image(capture_mode=capture_mode) # Pass mode
         if img:
             try: img.save(file_path); logging.info(f"Canvas saved: {file_path}"); messagebox.showinfo("Save OK", f"Saved:\n{os.path.basename(file_path)}")
@@ -293,43 +327,35 @@ class CanvasWindow(tk.Frame):
     # --- Zoom Methods ---
     def handle_zoom(self, event):
         # (Remains the same)
-        scale_direction = 0.0; zoom_in_factor = 1.15; zoom_out_factor = 1 / zoom_in_factor; min_scale = 0.1 ; max_scale = 8.0
+        scale_direction = 0.0; zoom_in_factor = ZOOM_STEP; zoom_out_factor = 1 / zoom_in_factor; min_scale = 0.1 ; max_scale = 8.0
         if event.num == 5 or event.delta < 0: scale_direction = zoom_out_factor
         elif event.num == 4 or event.delta > 0: scale_direction = zoom_in_factor
         else: return
-        prospective_new_scale = self.current_scale_factor * scale_direction
+        if self.pixel_zoom.get(): # Integer factors only (x2, x3 .. or 1/2, 1/3 ..), scaled natively by Tk
+            prospective_new_scale = pixel_zoom_step(self.current_scale_factor, scale_direction > 1, min_scale, max_scale)
+            if prospective_new_scale is None: return
+        else: prospective_new_scale = quantize_scale(self.current_scale_factor * scale_direction) # Exact levels, so cached zooms hit
         if prospective_new_scale < min_scale or prospective_new_scale > max_scale: return
-        new_total_scale_factor = prospective_new_scale
+        new_total_scale_factor = prospective_new_scale; scale_direction = new_total_scale_factor / self.current_scale_factor
         logging.debug(f"Zooming to scale: {new_total_scale_factor:.2f}")
         canvas_x = self.canvas.canvasx(event.x); canvas_y = self.canvas.canvasy(event.y)
-        new_tile_tk_images = [] ; new_overlay_tk_image = None
+        new_overlay_tk_image = None
         try:
-            for filename, image_info in self.images.items():
-                item_id=image_info['id']; original_pil=image_info['image'];
-                if not original_pil: continue
-                new_w=max(1,int(original_pil.width*new_total_scale_factor)); new_h=max(1,int(original_pil.height*new_total_scale_factor))
-                # Use NEAREST for pixel-perfect zoom
-                resized_pil = original_pil.resize((new_w, new_h), Image.NEAREST)
-                if self.transparency_color:
-                    hex_color = self.transparency_color.lstrip('#')
-                    color_tuple = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                    resized_pil = self.bg_handler.apply_transparency(
-                        resized_pil, 
-                        color_tuple,
-                        invert=self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
-                    )
-                new_tk = ImageTk.PhotoImage(resized_pil); new_tile_tk_images.append(new_tk)
-                if self.canvas.find_withtag(item_id): self.canvas.itemconfig(item_id, image=new_tk)
+            # Tiles are re-rendered by tile_renderer once the view has moved (only the visible ones)
             if self.pasted_overlay_item_id and self.pasted_overlay_pil_image:
                 item_id=self.pasted_overlay_item_id; original_pil=self.pasted_overlay_pil_image
                 new_w=max(1,int(original_pil.width*new_total_scale_factor)); new_h=max(1,int(original_pil.height*new_total_scale_factor))
                 resized_pil = original_pil.resize((new_w, new_h), Image.NEAREST)
-                new_tk = ImageTk.PhotoImage(resized_pil); new_overlay_tk_image = new_tk
+                new_tk = to_photo(resized_pil, self.canvas); new_overlay_tk_image = new_tk
                 if self.canvas.find_withtag(item_id): self.canvas.itemconfig(item_id, image=new_tk)
-            self.tk_images = new_tile_tk_images; self.pasted_overlay_tk_image = new_overlay_tk_image
+            self.pasted_overlay_tk_image = new_overlay_tk_image
         except Exception as resize_err: logging.error(f"Zoom resize error: {resize_err}", exc_info=True)
-        self.canvas.scale("all", canvas_x, canvas_y, scale_direction, scale_direction)
+        # Scale about canvas 0,0 so canvas coords stay world * scale, then scroll the cursor point back under the cursor
+        self.canvas.scale("all", 0, 0, scale_direction, scale_direction)
         self.current_scale_factor = new_total_scale_factor
+        self._update_scrollregion()
+        self._scroll_canvas_point_to(canvas_x * scale_direction, canvas_y * scale_direction, event.x, event.y)
+        self._cancel_key_preview(); self.tile_renderer.update(progressive=True) # Items moved already; resampling follows in the background
         if hasattr(self.interaction_handler, '_update_selection_visual_positions'): self.interaction_handler._update_selection_visual_positions()
         self.draw_grid()
         self._show_zoom_percentage(event)
@@ -339,39 +365,36 @@ class CanvasWindow(tk.Frame):
         logging.debug("Resetting zoom to 1.0")
         if abs(self.current_scale_factor - 1.0) < 0.001: return
         inverse_scale = 1.0 / self.current_scale_factor
-        new_tile_tk_images = [] ; new_overlay_tk_image = None
+        new_overlay_tk_image = None
         try:
-            for filename, image_info in self.images.items():
-                item_id=image_info['id']; original_pil=image_info['image'];
-                if not original_pil: continue
-                display_pil=original_pil.copy()
-                if self.transparency_color:
-                    hex_color = self.transparency_color.lstrip('#')
-                    color_tuple = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                    display_pil = self.bg_handler.apply_transparency(
-                        display_pil, 
-                        color_tuple,
-                        invert=self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
-                    )
-                new_tk = ImageTk.PhotoImage(display_pil); new_tile_tk_images.append(new_tk)
-                if self.canvas.find_withtag(item_id): self.canvas.itemconfig(item_id, image=new_tk)
             if self.pasted_overlay_item_id and self.pasted_overlay_pil_image:
                 item_id=self.pasted_overlay_item_id; original_pil=self.pasted_overlay_pil_image
-                new_tk = ImageTk.PhotoImage(original_pil); new_overlay_tk_image = new_tk
+                new_tk = to_photo(original_pil, self.canvas); new_overlay_tk_image = new_tk
                 if self.canvas.find_withtag(item_id): self.canvas.itemconfig(item_id, image=new_tk)
-            self.tk_images = new_tile_tk_images; self.pasted_overlay_tk_image = new_overlay_tk_image
+            self.pasted_overlay_tk_image = new_overlay_tk_image
         except Exception as resize_err: logging.error(f"Zoom reset resize error: {resize_err}", exc_info=True)
+        view_x = self.canvas.canvasx(0) * inverse_scale; view_y = self.canvas.canvasy(0) * inverse_scale
         self.canvas.scale("all", 0, 0, inverse_scale, inverse_scale)
         self.current_scale_factor = 1.0
+        self._update_scrollregion()
+        self._scroll_canvas_point_to(view_x, view_y, 0, 0)
+        # Stored world coords are authoritative: put items exactly back on them (drops float drift from scaling)
+        for filename, image_info in self.images.items():
+             if self.canvas.find_withtag(image_info['id']): self.canvas.coords(image_info['id'], image_info['x'], image_info['y'])
+        if self.pasted_overlay_item_id and self.canvas.find_withtag(self.pasted_overlay_item_id):
+             self.canvas.coords(self.pasted_overlay_item_id, *self.pasted_overlay_offset)
+        self._cancel_key_preview(); self.tile_renderer.update(progressive=True)
         if hasattr(self.interaction_handler, '_update_selection_visual_positions'): self.interaction_handler._update_selection_visual_positions()
         self.draw_grid()
-        for item_id in self.canvas.find_withtag("draggable"):
-             coords = self.canvas.coords(item_id)
-             if coords and hasattr(self.interaction_handler, '_update_item_stored_coords'):
-                  self.interaction_handler._update_item_stored_coords(item_id, round(coords[0]), round(coords[1]))
         logging.info("Zoom reset finished.")
         if event: self._show_zoom_percentage(event, force_text="100%")
 
+    def _scroll_canvas_point_to(self, canvas_x, canvas_y, window_x, window_y):
+        """Scrolls so that canvas point (canvas_x, canvas_y) shows at window position (window_x, window_y)."""
+        region_w = self.canvas_world_width * self.current_scale_factor; region_h = self.canvas_world_height * self.current_scale_factor
+        if region_w > 0: self.canvas.xview_moveto((canvas_x - window_x) / region_w)
+        if region_h > 0: self.canvas.yview_moveto((canvas_y - window_y) / region_h)
+
     # *** MODIFIED ZOOM LABEL POSITIONING ***
     def _show_zoom_percentage(self, event, force_text=None):
         """Displays temporary label AT the cursor (using event window coords)."""
@@ -529,6 +552,8 @@ class CanvasWindow(tk.Frame):
         if self.canvas.find_withtag(grid_tag):
             if self.canvas.find_withtag("draggable"):
                 self.canvas.tag_lower(grid_tag, "draggable")
+            if self.canvas.find_withtag("composite"):
+                self.canvas.tag_lower(grid_tag, "composite")
 
         # Ensure border is below grid
         if self.canvas.find_withtag("canvas_border"):
@@ -568,7 +593,15 @@ class CanvasWindow(tk.Frame):
         layout["settings"]["canvas_width"] = self.canvas_world_width
         layout["settings"]["canvas_height"] = self.canvas_world_height
         layout["settings"]["capture_mode"] = self.app.capture_mode_var.get() # Save radio button state
-        for filename, data in self.images.items(): layout["canvas_items"].append({"filepath": filename, "x": data.get('x', 0), "y": data.get('y', 0)})
+        for filename, data in self.images.items():
+            item = {"filepath": filename, "x": data.get('x', 0), "y": data.get('y', 0)}
+            if data.get('initial_transparency_color'): item["transparency_color"] = data['initial_transparency_color']
+            layout["canvas_items"].append(item)
+        # Key/blend settings, so a layout can be applied headless (apply_cli.py)
+        layout["settings"]["transparency_color"] = self.transparency_color
+        layout["settings"]["tolerance"] = self.app.tolerance_value.get() if hasattr(self.app, 'tolerance_value') else 0
+        layout["settings"]["invert_transparency"] = self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
+        layout["settings"]["overlay_opacity"] = self.app.overlay_opacity_var.get() if hasattr(self.app, 'overlay_opacity_var') else 100
         if self.pasted_overlay_item_id and self.canvas.find_withtag(self.pasted_overlay_item_id):
             layout["overlay"] = {"x": self.pasted_overlay_offset[0], "y": self.pasted_overlay_offset[1]}
             # --- Save overlay image data as base64 PNG ---
@@ -596,7 +629,7 @@ class CanvasWindow(tk.Frame):
             draggable_items = self.canvas.find_withtag("draggable");
             for item_id in draggable_items:
                 if self.canvas.find_withtag(item_id): self.canvas.delete(item_id)
-            self.images.clear(); self.tk_images.clear(); self.pasted_overlay_pil_image=None; self.pasted_overlay_tk_image=None; self.pasted_overlay_item_id=None; self.pasted_overlay_offset=(0,0); self.last_clicked_item_id=None; self.selected_item_ids.clear();
+            self.images.clear(); self.key_mask_cache.clear(); self.scaled_image_cache.clear(); self.tile_renderer.clear(); self.pasted_overlay_pil_image=None; self.pasted_overlay_tk_image=None; self.pasted_overlay_item_id=None; self.pasted_overlay_offset=(0,0); self.last_clicked_item_id=None; self.selected_item_ids.clear();
             if hasattr(self.interaction_handler, 'clear_selection_visuals'): self.interaction_handler.clear_selection_visuals()
             # Apply Settings
             bg_hex = settings_data.get("background_color"); grid_name = settings_data.get("selected_grid", "None"); snap = settings_data.get("snap_enabled", True); overlap = settings_data.get("overlap_enabled", True)
@@ -622,7 +655,7 @@ class CanvasWindow(tk.Frame):
                         overlay_bytes = base64.b64decode(overlay_img_b64)
                         overlay_img = Image.open(io.BytesIO(overlay_bytes)).convert("RGBA")
                         self.pasted_overlay_pil_image = overlay_img
-                        self.pasted_overlay_tk_image = ImageTk.PhotoImage(overlay_img)
+                        self.pasted_overlay_tk_image = to_photo(overlay_img, self.canvas)
                         if self.pasted_overlay_item_id and self.canvas.find_withtag(self.pasted_overlay_item_id):
                             self.canvas.delete(self.pasted_overlay_item_id)
                         self.pasted_overlay_item_id = self.canvas.create_image(self.pasted_overlay_offset[0], self.pasted_overlay_offset[1], anchor="nw", image=self.pasted_overlay_tk_image, tags=("draggable", "pasted_overlay"))
@@ -639,94 +672,74 @@ class CanvasWindow(tk.Frame):
     # --- Other Methods ---
     def select_image(self, index): logging.warning("CanvasWindow.select_image(index) not implemented.")
 
-    def redraw_canvas(self):
-        """Redraws all items on the canvas with z-index ordering."""
+    def redraw_canvas(self, moved=None, restack=True):
+        """Brings the canvas in line with the scene (tiles, overlay, z-order) without rebuilding it: only items
+        that moved, changed stacking slot, are missing or stale get coords/tag_raise/create/delete calls,
+        so item ids stay stable. moved: tiles whose position may have changed (None checks all);
+        restack=False skips the z-order check (undo/redo pass both, so undoing one move is a single coords call)."""
         try:
-            # Store current items with their z-index
-            current_items = []
-            for filename, data in self.images.items():
-                current_items.append((data.get('z_index', 0), filename, data))
-            
-            # Sort by z-index
-            current_items.sort(key=lambda x: x[0])
-            
-            # Clear canvas
-            self.canvas.delete("all")
-            
-            # Set canvas background color
-            if self.background_color:
-                hex_color = self.background_color.lstrip('#')
-                rgb = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                self.canvas.configure(bg=f'#{hex_color}')
-            else:
-                self.canvas.configure(bg='white')  # Default to white
-            
-            # Draw overlay first if it should be behind
-            if self.layer_behind and self.pasted_overlay_pil_image:
-                overlay_image = ImageTk.PhotoImage(self.pasted_overlay_pil_image)
-                self.pasted_overlay_tk_image = overlay_image
-                self.pasted_overlay_item_id = self.canvas.create_image(
-                    self.pasted_overlay_offset[0],
-                    self.pasted_overlay_offset[1],
-                    image=overlay_image,
-                    anchor="nw",
-                    tags=("draggable", "pasted_overlay")
-                )
-            
-            # Draw all regular images in z-index order
-            for _, filename, data in current_items:
-                try:
-                    # Get original image and apply transparency if needed
-                    image = data.get('original_image', data['image']).copy()
-                    if self.transparency_color:
-                        hex_color = self.transparency_color.lstrip('#')
-                        color_tuple = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                        image = self.bg_handler.apply_transparency(
-                            image,
-                            color_tuple,
-                            invert=self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
-                        )
-                    
-                    # Create and display image
-                    tk_image = ImageTk.PhotoImage(image)
-                    self.tk_images.append(tk_image)
-                    image_id = self.canvas.create_image(
-                        data['x'], data['y'],
-                        anchor="nw",
-                        image=tk_image,
-                        tags=("draggable", filename)
-                    )
-                    data['id'] = image_id
-                    
-                except Exception as e:
-                    logging.error(f"Error redrawing image {filename}: {e}", exc_info=True)
-            
-            # Draw overlay last if it should be on top
-            if not self.layer_behind and self.pasted_overlay_pil_image:
-                overlay_image = ImageTk.PhotoImage(self.pasted_overlay_pil_image)
-                self.pasted_overlay_tk_image = overlay_image
-                self.pasted_overlay_item_id = self.canvas.create_image(
-                    self.pasted_overlay_offset[0],
-                    self.pasted_overlay_offset[1],
-                    image=overlay_image,
-                    anchor="nw",
-                    tags=("draggable", "pasted_overlay")
-                )
-            
-            # Draw grid
-            self.draw_grid()
-            
-            # Update selection visuals
+            self._cancel_key_preview(); canvas = self.canvas; renderer = self.tile_renderer
+            canvas.configure(bg=f"#{self.background_color.lstrip('#')}" if self.background_color else 'white')
+            # Tiles: recreate missing items, move the ones that are off their world position
+            created = []
+            for filename in (self.images if moved is None else [f for f in moved if f in self.images]):
+                data = self.images[filename]; x, y = self.world_to_canvas(data['x'], data['y'])
+                coords = canvas.coords(data['id']) if data.get('id') else []
+                if not coords:
+                    renderer.detach(filename)
+                    renderer.create_item(filename, data)
+                    created.append(filename)
+                elif abs(coords[0] - x) > 0.5 or abs(coords[1] - y) > 0.5:
+                    w, h = data['image'].size; s = self.current_scale_factor
+                    old_bbox = (coords[0], coords[1], coords[0] + max(1, int(w * s)), coords[1] + max(1, int(h * s)))
+                    canvas.coords(data['id'], x, y); renderer.moved(filename, old_bbox)
+            if moved is None: # Items of tiles that are gone
+                known = {data['id'] for data in self.images.values()} | {self.pasted_overlay_item_id}
+                for item_id in canvas.find_withtag("draggable"):
+                    if item_id not in known: canvas.delete(item_id)
+            # Z-order: restack only the tiles out of order
+            if restack or created:
+                names = {data['id']: filename for filename, data in self.images.items()}
+                current = [names[item_id] for item_id in canvas.find_withtag("draggable") if item_id in names]
+                desired = sorted(self.images, key=lambda f: (self.images[f].get('z_index', 0), self.images[f]['id']))
+                to_move = stacking_moves(current, desired); to_move_set = set(to_move)
+                for k, filename in enumerate(desired):
+                    if filename not in to_move_set: continue
+                    if k: canvas.tag_raise(self.images[filename]['id'], renderer.top_item(desired[k - 1]))
+                    else: canvas.tag_lower(self.images[filename]['id'], "draggable")
+                    renderer.restacked(filename)
+                if to_move: logging.debug(f"Redraw: restacked {len(to_move)} of {len(desired)} tile(s).")
+            self._sync_overlay_item()
+            renderer.update() # Renders new/moved tiles in view, re-keys everything if the key settings changed
+            if self.current_grid_info and not canvas.find_withtag("grid_line"): self.draw_grid()
             if hasattr(self.interaction_handler, 'update_selection_visuals'):
-                self.interaction_handler.update_selection_visuals()
-            
-            # Update layers window if it exists
+                self.interaction_handler.update_selection_visuals(); self.interaction_handler._update_selection_visual_positions()
             if hasattr(self.app, 'layers_window') and self.app.layers_window:
                 self.app.layers_window.refresh_layers()
-            
         except Exception as e:
             logging.error(f"Error in redraw_canvas: {e}", exc_info=True)
 
+    def _sync_overlay_item(self):
+        """Creates, moves, re-images or deletes the pasted overlay's item to match the overlay state, then stacks it."""
+        canvas = self.canvas; item_id = self.pasted_overlay_item_id
+        exists = bool(item_id and canvas.find_withtag(item_id))
+        if not self.pasted_overlay_pil_image:
+            if exists: canvas.delete(item_id)
+            self.pasted_overlay_item_id = None; self.pasted_overlay_tk_image = None; self._overlay_source = None; return
+        pil = self.pasted_overlay_pil_image; x, y = self.world_to_canvas(*self.pasted_overlay_offset)
+        size = (max(1, int(pil.width * self.current_scale_factor)), max(1, int(pil.height * self.current_scale_factor)))
+        photo = self.pasted_overlay_tk_image
+        if photo is None or self._overlay_source is not pil or (photo.width(), photo.height()) != size:
+            photo = self.pasted_overlay_tk_image = to_photo(self.scale_for_view(pil), canvas); self._overlay_source = pil
+            if exists: canvas.itemconfig(item_id, image=photo)
+        if not exists: self.pasted_overlay_item_id = canvas.create_image(x, y, image=photo, anchor="nw", tags=("draggable", "pasted_overlay"))
+        else:
+            coords = canvas.coords(item_id)
+            if abs(coords[0] - x) > 0.5 or abs(coords[1] - y) > 0.5: canvas.coords(item_id, x, y)
+        if self.layer_behind: canvas.tag_lower(self.pasted_overlay_item_id, "draggable")
+        else: canvas.tag_raise(self.pasted_overlay_item_id)
+        self.tile_renderer.restack()
+
     def update_canvas_bounds(self, width, height):
         """Update the canvas scroll region with padding"""
         padding = 100  # Padding around content area
@@ -823,6 +836,11 @@ class CanvasWindow(tk.Frame):
         except Exception as e:
             logging.error(f"Error handling drag: {str(e)}")
 
+    def on_raster_toggle(self):
+        """Raster mode draws all unselected tiles as one composited viewport image (for very large layouts)."""
+        self.tile_renderer.set_raster_mode(self.raster_mode.get())
+        self.redraw_canvas()
+
     def update_overlay_stacking(self):
         """Raise or lower the overlay image based on the checkbox state."""
         if self.pasted_overlay_item_id and self.canvas.find_withtag(self.pasted_overlay_item_id):
@@ -832,22 +850,12 @@ class CanvasWindow(tk.Frame):
             else:
                 # Move overlay above all
                 self.canvas.tag_raise(self.pasted_overlay_item_id)
+            self.tile_renderer.restack()
 
     def remap_all_images_to_palette(self, palette_colors):
         """Remap all images on the canvas to use only the given palette colors."""
-        import numpy as np
-        from PIL import Image
         # Get transparency color as RGB tuple
-        transparency_color = None
-        if hasattr(self, 'transparency_color') and self.transparency_color:
-            hexval = self.transparency_color.lstrip('#')
-            transparency_color = tuple(int(hexval[i:i+2], 16) for i in (0, 2, 4))
-            
-        def closest_color(pixel, palette):
-            # Find closest color in palette (Euclidean distance in RGB)
-            arr = np.array(palette)
-            dists = np.sum((arr - pixel) ** 2, axis=1)
-            return tuple(arr[np.argmin(dists)])
+        transparency_color = parse_key(getattr(self, 'transparency_color', None))[0] # Exact match unless a tolerance is given per key
             
         for filename, data in self.images.items():
             try:
@@ -856,29 +864,14 @@ class CanvasWindow(tk.Frame):
                 if not pil_img:
                     continue
                     
-                arr = np.array(pil_img.convert('RGB'))
-                shape = arr.shape
-                arr_flat = arr.reshape(-1, 3)
-                remapped = []
-                
-                for px in arr_flat:
-                    if transparency_color and tuple(px) == transparency_color:
-                        remapped.append([0,0,0,0])
-                    else:
-                        rgb = closest_color(px, palette_colors)
-                        remapped.append([*rgb,255])
-                        
-                arr_remap = np.array(remapped, dtype=np.uint8).reshape((shape[0], shape[1], 4))
-                new_img = Image.fromarray(arr_remap, 'RGBA')
+                # Closest color per palette entry (indexed tiles) or per unique color, then one lookup
+                new_img = remap_to_palette(pil_img, palette_colors, transparency_color)
                 
                 # Update the image in our data structure
-                data['image'] = new_img
+                data['image'] = new_img; self.key_mask_cache.bump_revision(data)
                 
-                # Create and update the display image
-                tk_img = ImageTk.PhotoImage(new_img)
-                self.tk_images.append(tk_img)
-                if self.canvas.find_withtag(data['id']):
-                    self.canvas.itemconfig(data['id'], image=tk_img)
+                # Update the display image (if in view)
+                self.tile_renderer.invalidate(filename)
                     
                 # Save the remapped image to file when Apply Canvas is used
                 if hasattr(self, 'app') and hasattr(self.app, 'applying_canvas') and self.app.applying_canvas:
@@ -888,17 +881,16 @@ class CanvasWindow(tk.Frame):
             except Exception as e:
                 logging.error(f"Error remapping image {filename}: {e}", exc_info=True)
                 
+        self.tile_renderer.update()
         logging.info(f"Remapped all images to palette of {len(palette_colors)} colors, preserving transparency.")
 
     def refresh_all_tiles_to_original(self):
         """Restore all images to their original (pre-palette) state."""
         for filename, data in self.images.items():
             if 'original_image' in data:
-                data['image'] = data['original_image']
-                tk_img = ImageTk.PhotoImage(data['original_image'])
-                self.tk_images.append(tk_img)
-                if self.canvas.find_withtag(data['id']):
-                    self.canvas.itemconfig(data['id'], image=tk_img)
+                data['image'] = data['original_image']; self.key_mask_cache.bump_revision(data)
+                self.tile_renderer.invalidate(filename)
+        self.tile_renderer.update()
         logging.info("All tiles restored to original images after palette removal.")
 
     def set_canvas_background_color(self, color):
@@ -1018,7 +1010,7 @@ class CanvasWindow(tk.Frame):
                         if data['id'] == self._item_id:
                             data['x'] = x
                             data['y'] = y
-                            self._canvas_window.canvas.coords(self._item_id, x, y)
+                            self._canvas_window.canvas.coords(self._item_id, *self._canvas_window.world_to_canvas(x, y))
                             break
 
                 def get_size(self):
@@ -1120,7 +1112,7 @@ class CanvasWindow(tk.Frame):
             state = {
                 'images': {},
                 'overlay': {
-                    'image': self.pasted_overlay_pil_image.copy() if self.pasted_overlay_pil_image else None,
+                    'image': self.pasted_overlay_pil_image, # Replaced on paste, never edited in place: safe to share
                     'offset': self.pasted_overlay_offset
                 }
             }
@@ -1196,7 +1188,7 @@ class CanvasWindow(tk.Frame):
             state = {
                 'images': {},
                 'overlay': {
-                    'image': self.pasted_overlay_pil_image.copy() if self.pasted_overlay_pil_image else None,
+                    'image': self.pasted_overlay_pil_image, # Replaced on paste, never edited in place: safe to share
                     'offset': self.pasted_overlay_offset
                 }
             }
@@ -1219,12 +1211,16 @@ class CanvasWindow(tk.Frame):
             if not state:
                 return
                 
-            # Restore image positions and z-indices
+            # Restore image positions and z-indices, noting what actually changed
+            moved = []; restack = False
             for filepath, data in state['images'].items():
                 if filepath in self.images:
-                    self.images[filepath]['x'] = data['x']
-                    self.images[filepath]['y'] = data['y']
-                    self.images[filepath]['z_index'] = data.get('z_index', 0)
+                    image_info = self.images[filepath]
+                    if (image_info['x'], image_info['y']) != (data['x'], data['y']): moved.append(filepath)
+                    if image_info.get('z_index', 0) != data.get('z_index', 0): restack = True
+                    image_info['x'] = data['x']
+                    image_info['y'] = data['y']
+                    image_info['z_index'] = data.get('z_index', 0)
             
             # Restore overlay
             overlay_state = state['overlay']
@@ -1235,8 +1231,8 @@ class CanvasWindow(tk.Frame):
                 self.pasted_overlay_pil_image = None
                 self.pasted_overlay_offset = (0, 0)
             
-            # Redraw canvas with restored state
-            self.redraw_canvas()
+            # Update only the items that changed
+            self.redraw_canvas(moved=moved, restack=restack)
             
         except Exception as e:
             logging.error(f"Error restoring state: {e}", exc_info=True)
@@ -1265,7 +1261,7 @@ class CanvasWindow(tk.Frame):
             overlay_with_opacity = Image.merge('RGBA', (r, g, b, a))
             
             # Update the Tkinter image and redraw
-            self.pasted_overlay_tk_image = ImageTk.PhotoImage(overlay_with_opacity)
+            self.pasted_overlay_tk_image = to_photo(self.scale_for_view(overlay_with_opacity), self.canvas)
             if self.pasted_overlay_item_id:
                 self.canvas.itemconfig(self.pasted_overlay_item_id, image=self.pasted_overlay_tk_image)
             
@@ -1342,28 +1338,17 @@ class CanvasWindow(tk.Frame):
                         error_count += 1
                         continue
                         
-                    # Load current file state
-                    fresh_image = Image.open(filename).convert("RGBA")
+                    # Load current file state (indexed tiles stay 'P', keyed via their palette)
+                    fresh_image = Image.open(filename); fresh_image.load()
+                    if fresh_image.mode not in ('P', 'RGBA'): fresh_image = fresh_image.convert("RGBA")
                     
-                    # Store as new original
+                    # Store as new original (new revision, so cached key masks are recomputed)
                     data['original_image'] = fresh_image.copy()
                     data['image'] = fresh_image.copy()
+                    self.key_mask_cache.bump_revision(data)
                     
-                    # Create new display image
-                    if self.transparency_color:
-                        hex_color = self.transparency_color.lstrip('#')
-                        color_tuple = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-                        fresh_image = self.bg_handler.apply_transparency(
-                            fresh_image,
-                            color_tuple,
-                            invert=self.app.invert_transparency.get() if hasattr(self.app, 'invert_transparency') else False
-                        )
-                    
-                    # Update display
-                    tk_img = ImageTk.PhotoImage(fresh_image)
-                    self.tk_images.append(tk_img)
-                    if self.canvas.find_withtag(data['id']):
-                        self.canvas.itemconfig(data['id'], image=tk_img)
+                    # Update display (if in view)
+                    self.tile_renderer.invalidate(filename)
                     updated_count += 1
                     
                 except Exception as e:
@@ -1371,6 +1356,8 @@ class CanvasWindow(tk.Frame):
                     error_count += 1
                     continue
             
+            self.tile_renderer.update()
+            
             # Show results
             if updated_count > 0:
                 messagebox.showinfo("Refresh Complete", f"Updated {updated_count} images." + 
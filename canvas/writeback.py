@@ -0,0 +1,92 @@
+# --- canvas/writeback.py ---
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from PIL import Image
+
+TEMP_SUFFIX = ".canvas-tmp"
+
+def _current_umask():
+    mask = os.umask(0); os.umask(mask) # Only readable by setting it; done once at import
+    return mask
+
+NEW_FILE_MODE = 0o666 & ~_current_umask() # Mode open() would give a new file; mkstemp's is 0600
+
+def pixel_digest(image):
+    """Hash of an image's RGBA pixel buffer (and size), independent of file encoding."""
+    if image.mode != 'RGBA': image = image.convert('RGBA')
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.width}x{image.height}".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.digest()
+
+def _fsync_path(path, directory=False):
+    if directory and os.name == 'nt': return # Windows can't open/fsync directories
+    fd = os.open(path, os.O_RDONLY if directory else os.O_RDWR)
+    try: os.fsync(fd)
+    finally: os.close(fd)
+
+def _copy_target_mode(temp_path, filename):
+    """Gives the temp file the permissions of the file it replaces, or a new file's default."""
+    if os.path.exists(filename): shutil.copymode(filename, temp_path)
+    else: os.chmod(temp_path, NEW_FILE_MODE)
+
+class TileWriter:
+    """Skip-unchanged, atomic tile writer.
+    write() compares pixels with the file on disk and, if they differ, encodes to a
+    temp file in the same directory. flush() fsyncs the pending batch, renames each
+    file into place and syncs the touched directories once."""
+    def __init__(self, batch_size=32):
+        self.batch_size = batch_size
+        self.pending = []  # [(temp_path, final_path)]
+        self.errors = {}   # {final_path: error message}
+        self.written_count = 0; self.skipped_count = 0; self.bytes_written = 0
+
+    def matches_disk(self, filename, image):
+        try:
+            with Image.open(filename) as disk_image:
+                return pixel_digest(disk_image) == pixel_digest(image)
+        except Exception:
+            return False # Missing/unreadable file always gets written
+
+    def write(self, filename, image):
+        """Queues image for filename. Returns False if the file already holds these pixels."""
+        if self.matches_disk(filename, image):
+            self.skipped_count += 1
+            logging.debug(f"Write-back skip '{os.path.basename(filename)}': Unchanged.")
+            return False
+        directory = os.path.dirname(os.path.abspath(filename))
+        file_format = Image.registered_extensions().get(os.path.splitext(filename)[1].lower())
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=TEMP_SUFFIX, dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, format=file_format)
+            _copy_target_mode(temp_path, filename)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        self.pending.append((temp_path, filename))
+        self.bytes_written += os.path.getsize(temp_path)
+        if len(self.pending) >= self.batch_size: self.flush()
+        return True
+
+    def flush(self):
+        """Makes the pending batch durable and moves it into place."""
+        pending, self.pending = self.pending, []
+        directories = set()
+        for temp_path, filename in pending:
+            try:
+                _fsync_path(temp_path)
+                os.replace(temp_path, filename)
+                directories.add(os.path.dirname(os.path.abspath(filename)))
+                self.written_count += 1
+            except Exception as e:
+                logging.error(f"Write-back failed '{filename}': {e}", exc_info=True)
+                self.errors[filename] = str(e)
+                try: os.remove(temp_path)
+                except OSError: pass
+        for directory in directories:
+            try: _fsync_path(directory, directory=True)
+            except OSError as e: logging.warning(f"Directory fsync failed '{directory}': {e}")
@@ -1,10 +1,11 @@
 # --- grid_window.py ---
 import tkinter as tk
 from tkinter import filedialog, Canvas, Frame, Label, Scale, Button, Scrollbar, messagebox
-from PIL import Image, ImageTk
+from PIL import Image
 import os
 import logging
 import sys # For platform check
+from canvas.tkimage import to_photo, update_photo
 
 # Check Pillow version for Resampling attribute
 try:
@@ -37,7 +38,7 @@ class GridWindow(tk.Frame):
         self.config = config
 
         # --- State ---
-        self.images_data = {} # {filepath: {'pil_image': pil_img, 'thumb_photo': None, 'item_frame': frame_widget}}
+        self.images_data = {} # {filepath: {'pil_image': pil_img, 'thumb_photo': None, 'item_frame': frame_widget, 'img_label': label_widget}}
         self.thumb_tk_images = []
         self.sorted_paths = []
         self.selected_paths = set()
@@ -167,14 +168,14 @@ class GridWindow(tk.Frame):
 
             try:
                 thumb_pil = resize_image_keeping_aspect_ratio(pil_image, max_thumb_size, max_thumb_size)
-                thumb_photo = ImageTk.PhotoImage(thumb_pil)
+                thumb_photo = to_photo(thumb_pil, self.inner_frame)
                 data['thumb_photo'] = thumb_photo; self.thumb_tk_images.append(thumb_photo)
 
                 item_frame = Frame(self.inner_frame, relief="flat", borderwidth=1)
                 data['item_frame'] = item_frame; item_frame.filepath = filepath
 
                 img_label = Label(item_frame, image=thumb_photo, borderwidth=0)
-                img_label.pack(side="top")
+                img_label.pack(side="top"); data['img_label'] = img_label
                 basename = os.path.basename(filepath); display_name = basename if len(basename) < 25 else basename[:22] + "..."
                 name_label_width = max(10, int(max_thumb_size / 6.5))
                 name_label = Label(item_frame, text=display_name, font=("Arial", 8), width=name_label_width, anchor='n')
@@ -384,10 +385,41 @@ class GridWindow(tk.Frame):
         return self.sorted_paths
 
     def update_image_in_grid(self, filename, updated_pil_image):
-         """Updates PIL data and triggers redisplay."""
-         norm_path = os.path.normpath(os.path.abspath(filename))
-         if norm_path in self.images_data:
+         """Updates PIL data and swaps that one thumbnail in place."""
+         self.update_images_in_grid([(filename, updated_pil_image)])
+
+    def update_images_in_grid(self, updates):
+         """Bulk update from [(filename, pil_image)]: swaps only the affected thumbnails,
+         then refreshes the panel once. Falls back to a full redisplay if a widget is missing."""
+         needs_redisplay = False; updated_count = 0
+         for filename, updated_pil_image in updates:
+             norm_path = os.path.normpath(os.path.abspath(filename))
+             if norm_path not in self.images_data:
+                 logging.warning(f"GridWindow update requested for unknown file: {filename}"); continue
              logging.debug(f"GridWindow updating PIL for: {os.path.basename(norm_path)}")
              self.images_data[norm_path]['pil_image'] = updated_pil_image
-             self._redisplay_images() # Simple redisplay
-         else: logging.warning(f"GridWindow update requested for unknown file: {filename}")
\ No newline at end of file
+             if not needs_redisplay and not self._swap_thumbnail(norm_path): needs_redisplay = True
+             updated_count += 1
+         if needs_redisplay: self._redisplay_images()
+         elif updated_count:
+             self.inner_frame.update_idletasks()
+             self.canvas.after_idle(self._on_inner_frame_configure)
+
+    def _swap_thumbnail(self, filepath):
+         """Regenerates one thumbnail PhotoImage and puts it into the existing label. False if not displayed."""
+         data = self.images_data[filepath]; img_label = data.get('img_label')
+         if img_label is None or not img_label.winfo_exists(): return False
+         try:
+             thumb_pil = resize_image_keeping_aspect_ratio(data['pil_image'], self.thumbnail_size.get(), self.thumbnail_size.get())
+             old_photo = data.get('thumb_photo')
+             if old_photo is not None and (old_photo.width(), old_photo.height()) == thumb_pil.size:
+                 thumb_photo = update_photo(old_photo, thumb_pil) # Same size: rewrite the pixels in place
+             else: thumb_photo = to_photo(thumb_pil, self.inner_frame)
+         except Exception as e:
+             logging.error(f"Error updating thumbnail for {filepath}: {e}", exc_info=True); return False
+         if thumb_photo is old_photo: return True
+         img_label.config(image=thumb_photo)
+         data['thumb_photo'] = thumb_photo
+         if old_photo in self.thumb_tk_images: self.thumb_tk_images.remove(old_photo)
+         self.thumb_tk_images.append(thumb_photo)
+         return True
\ No newline at end of file
@@ -2,19 +2,16 @@ from PIL import Image, ImageEnhance, ImageDraw
 import logging
 import io
 import subprocess
+import numpy as np
+
+from canvas.keying import transparency_key_mask
 
 def apply_transparency(image, color):
     try:
         logging.info(f"Applying transparency to image with color: {color}")
-        image = image.convert("RGBA")
-        datas = image.getdata()
-        new_data = []
-        for item in datas:
-            if item[:3] == color:
-                new_data.append((255, 255, 255, 0))
-            else:
-                new_data.append(item)
-        image.putdata(new_data)
+        rgba = np.array(image.convert("RGBA"), dtype=np.uint8)
+        rgba[transparency_key_mask(rgba, tuple(color))] = (255, 255, 255, 0) # Exact match only
+        image = Image.fromarray(rgba, "RGBA")
         logging.info("Transparency applied successfully")
         return image
     except Exception as e:
@@ -79,7 +76,8 @@ def save_image(image, file_path):
 
 def load_image(file_path):
     try:
-        image = Image.open(file_path).convert("RGBA")
+        image = Image.open(file_path); image.load()
+        if image.mode not in ("P", "RGBA"): image = image.convert("RGBA") # Indexed images stay 'P'
         logging.info(f"Image loaded from {file_path}")
         return image
     except Exception as e:
@@ -8,8 +8,12 @@ import logging
 from PIL import ImageGrab, Image, ImageTk
 import io
 import platform
+import multiprocessing
+import queue
+import threading
 from grid_window import GridWindow
 from canvas.view import CanvasWindow
+from canvas.keydetect import KeyColorCache, detect_key_color
 import glob
 from canvas.layers_window import LayersWindow
 
@@ -34,6 +38,8 @@ class TerrainToolApp:
             self.layer_behind_mode = tk.BooleanVar(value=False)
             self.invert_transparency = tk.BooleanVar(value=False)
             self.tolerance_value = tk.IntVar(value=0)
+            self.parallel_apply = tk.BooleanVar(value=True)  # Spread apply over worker processes
+            self.dry_run_apply = tk.BooleanVar(value=False)  # Compute and report, write nothing
             self.move_step_var = tk.StringVar(value="2")  # Default move step size
             self.current_palette = None
             self.palette_colors = None
@@ -82,6 +88,9 @@ class TerrainToolApp:
             self.transparency_color_button = tk.Button(transparency_frame, text="Pick Color", command=self.start_select_transparency_color)
             self.transparency_color_button.pack(side="left", padx=2)
             
+            self.auto_key_button = tk.Button(transparency_frame, text="Auto", command=self.auto_detect_transparency_color)
+            self.auto_key_button.pack(side="left", padx=2)
+            
             self.tolerance_button = tk.Button(transparency_frame, text="Tolerance", command=self.open_tolerance_slider)
             self.tolerance_button.pack(side="left", padx=2)
             
@@ -89,7 +98,7 @@ class TerrainToolApp:
             self.color_preview = tk.Label(transparency_frame, text=" ", bg="black", width=2)
             self.color_preview.pack(side="left", padx=2)
             
-            self.color_entry = tk.Entry(transparency_frame, width=8)
+            self.color_entry = tk.Entry(transparency_frame, width=16)
             self.color_entry.insert(0, "#000000")
             self.color_entry.bind("<Return>", self.update_transparency_color)
             self.color_entry.pack(side="left", padx=2)
@@ -301,6 +310,12 @@ class TerrainToolApp:
             self.apply_button = tk.Button(apply_frame, text="Apply Canvas to Images", command=self.apply_canvas_to_images)
             self.apply_button.pack(side="right", padx=5)
             
+            self.parallel_apply_check = tk.Checkbutton(apply_frame, text="Parallel", variable=self.parallel_apply)
+            self.parallel_apply_check.pack(side="right", padx=2)
+            
+            self.dry_run_apply_check = tk.Checkbutton(apply_frame, text="Dry run", variable=self.dry_run_apply)
+            self.dry_run_apply_check.pack(side="right", padx=2)
+            
             # Load grid options
             self.load_grid_options()
             
@@ -329,10 +344,6 @@ class TerrainToolApp:
     def copy_canvas(self):
         try:
             logging.info(f"Copy Canvas requested (Mode: {self.capture_mode_var.get()})...")
-            if not (hasattr(self.canvas_window, 'current_scale_factor') and abs(self.canvas_window.current_scale_factor - 1.0) < 0.001):
-                messagebox.showwarning("Zoom Error", "Please reset zoom to 100% before copying (hotkey Z)")
-                logging.warning("Copy cancelled: Zoom not 100%.")
-                return
             if not hasattr(self.canvas_window, 'get_canvas_as_image'):
                 logging.error("Copy Error")
                 messagebox.showerror("Error", "Copy fn missing.")
@@ -512,11 +523,40 @@ class TerrainToolApp:
         except Exception as e: logging.error(f"Error start transparency color select: {e}", exc_info=True)
     def select_transparency_color(self, color):
         try:
-            self.color_preview.config(bg=color); self.color_entry.delete(0, tk.END); self.color_entry.insert(0, color)
+            # Several comma separated colors (each optionally ':tolerance') form a key set; preview shows the first
+            preview = color.split(',')[0].split(':')[0].strip(); preview = preview if preview.startswith('#') else f"#{preview}"
+            self.color_preview.config(bg=preview); self.color_entry.delete(0, tk.END); self.color_entry.insert(0, color)
             if hasattr(self.canvas_window, 'set_transparency_color'):
                 self.canvas_window.set_transparency_color(color)
             self.selecting_transparency_color = False; self.root.config(cursor="")
         except Exception as e: logging.error(f"Error selecting transparency color: {e}", exc_info=True)
+    def auto_detect_transparency_color(self):
+        """Proposes a key color and tolerance from the border colors of all loaded tiles (worker thread)."""
+        try:
+            tiles = {}
+            # Canvas tiles come first: they may be edited in memory (revision > 0), then they bypass the on-disk cache
+            if self.canvas_window: tiles.update((fp, (data['image'], data.get('revision', 0) == 0)) for fp, data in self.canvas_window.images.items())
+            if self.grid_window: tiles.update((fp, (data['pil_image'], True)) for fp, data in self.grid_window.images_data.items() if data.get('pil_image') and fp not in tiles)
+            if not tiles: messagebox.showinfo("Auto Key Color", "Load some images first."); return
+            if not hasattr(self, 'key_color_cache'): self.key_color_cache = KeyColorCache()
+            self.auto_key_button.config(state=tk.DISABLED); self.root.config(cursor="watch")
+            results = queue.Queue(); items = [(fp, image, unchanged) for fp, (image, unchanged) in tiles.items()]
+            def work():
+                try: results.put(('done', detect_key_color(items, self.key_color_cache)))
+                except Exception as e: logging.error(f"Auto key color error: {e}", exc_info=True); results.put(('error', str(e)))
+            threading.Thread(target=work, name="key-color-detect", daemon=True).start()
+            self.root.after(100, self._poll_auto_key_color, results, len(items))
+        except Exception as e: logging.error(f"Error starting auto key color: {e}", exc_info=True)
+    def _poll_auto_key_color(self, results, tile_count):
+        try: kind, value = results.get_nowait()
+        except queue.Empty: self.root.after(100, self._poll_auto_key_color, results, tile_count); return
+        self.auto_key_button.config(state=tk.NORMAL); self.root.config(cursor="")
+        if kind == 'error': messagebox.showerror("Auto Key Color", f"Detection failed.\n{value}"); return
+        if not value: messagebox.showinfo("Auto Key Color", "No opaque border colors found."); return
+        color, tolerance, share = value; hex_c = "#{:02x}{:02x}{:02x}".format(*color)
+        logging.info(f"Auto key color: {hex_c}, tolerance {tolerance}, covers {share:.0%} of {tile_count} tile border(s).")
+        if messagebox.askyesno("Auto Key Color", f"Proposed key color {hex_c} with tolerance {tolerance}\n(covers {share:.0%} of the border pixels of {tile_count} tile(s)).\n\nUse it?"):
+            self.tolerance_value.set(tolerance); self.select_transparency_color(hex_c)
     def cancel_select_transparency_color(self):
          self.selecting_transparency_color = False; self.root.config(cursor=""); logging.debug("Transparency color select cancelled.")
     def update_transparency_color(self, event):
@@ -543,7 +583,6 @@ class TerrainToolApp:
         except Exception as e: logging.error(f"Error pasting image: {e}", exc_info=True)
     def apply_canvas_to_images(self):
         try:
-            # Apply function now checks zoom itself
             if hasattr(self, 'palette_colors') and self.palette_colors:
                 self.apply_palette_to_canvas_images(self.palette_colors)
             if hasattr(self.canvas_window, 'apply_canvas_to_images'): self.canvas_window.apply_canvas_to_images()
@@ -603,9 +642,9 @@ class TerrainToolApp:
         slider = tk.Scale(win, from_=0, to=64, orient=tk.HORIZONTAL, variable=self.tolerance_value)
         slider.pack(padx=10, pady=5)
         def on_slide(val):
-            # Redraw all tiles with new tolerance
-            if hasattr(self.canvas_window, 'redraw_canvas'):
-                self.canvas_window.redraw_canvas()
+            # Debounced live preview: visible tiles re-keyed in place, the rest while idle
+            if hasattr(self.canvas_window, 'preview_key_change'):
+                self.canvas_window.preview_key_change()
         slider.config(command=on_slide)
         def close():
             win.destroy()
@@ -756,6 +795,7 @@ class TerrainToolApp:
             logging.error(f"Error changing overlay opacity: {e}", exc_info=True)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Parallel apply workers in the frozen EXE
     logging.info("="*20 + " Starting CanvasToImages " + "="*20)
     try:
         root = tk.Tk(); app = TerrainToolApp(root); root.mainloop()
@@ -0,0 +1,32 @@
+# --- tests/test_apply_report.py ---
+import numpy as np
+from PIL import Image
+
+from canvas.apply_kernel import apply_palette_to_tile
+from canvas.apply_report import tile_change_report
+
+KEY = (255, 0, 255)
+
+def _tile():
+    rgba = np.zeros((4, 4, 4), dtype=np.uint8); rgba[..., 3] = 255
+    rgba[:2] = KEY + (255,) # Top half keyed normally, bottom half keyed with invert
+    rgba[2:, :, :3] = (10, 20, 30)
+    return Image.fromarray(rgba, 'RGBA')
+
+def _remapped(tile):
+    rgba = np.array(tile); rgba[..., :3] = (200, 100, 50)
+    return Image.fromarray(rgba, 'RGBA')
+
+def test_key_preserved_after_apply():
+    tile = _tile()
+    for invert in (False, True):
+        output = apply_palette_to_tile(_remapped(tile), tile, KEY, 0, invert)
+        report = tile_change_report("a.png", output, tile, KEY, 0, invert)
+        assert report["key_pixels"] == 8
+        assert report["key_preserved"]
+
+def test_key_lost_when_keyed_pixels_changed():
+    tile = _tile()
+    for invert in (False, True):
+        report = tile_change_report("a.png", _remapped(tile), tile, KEY, 0, invert)
+        assert not report["key_preserved"]